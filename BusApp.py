@@ -1,65 +1,267 @@
+import math
+import threading
+import time
 import streamlit as st
 import pandas as pd
-import mysql.connector
-from mysql.connector import Error
+from BusFeatures import DURATION_PATTERN, SEAT_CLASSES, SEAT_TYPES, classify_ac, classify_seat
+from DataHandler import DATA_COLUMNS, create_data_handler
+from FilterIndex import FilterIndex
+from FilterQuery import build_count_query, build_filter_query
+from ParquetDataset import ParquetDataset
+
+
+# Seconds after which cached data is reloaded even when unchanged
+CACHE_TTL = 600
+# Seconds for which cached data is used without probing its version, so quick widget changes do not query database
+VERSION_CHECK_INTERVAL = 15
+# Filters kept when Show Buses is clicked, results are paged with these values
+FILTER_KEYS = ['route', 'seat_type', 'ac_type', 'min_rating', 'time_range', 'max_fare', 'max_duration']
+# Sort options of results, label to column
+SORT_OPTIONS = {'Departure': 'departure_minute', 'Price': 'price', 'Rating': 'rating', 'Duration': 'duration_minutes'}
+# Time columns of scraped data and their minutes since midnight columns kept after load
+TIME_COLUMNS = {'departure_time': 'departure_minute', 'arrival_time': 'arrival_minute'}
+PAGE_SIZES = [25, 50, 100]
 
 
 class BusApp:
-    def __init__(self, host, user, password, database, table):
-        self.db_config = {
-            'host': host,
-            'user': user,
-            'password': password,
-            'database': database
-        }
-        self.connection = None
+    # Data loaded by any session, keyed by credentials and table, shared by all Streamlit reruns of the process
+    _cache = {}
+    _cache_lock = threading.Lock()
+
+    def __init__(self, host, user, password, database, table, backend='mysql', dataset_dir=None, push_down=False):
+        # MySQL connections are taken from the pool shared by all reruns with same credentials
+        self.data_handler = create_data_handler(backend, host=host, user=user, password=password, database=database)
         self.df = None
+        self.index = None
+        self.matching_rows = []
         self.table = table
+        # Data is read from Parquet dataset instead of database table when given
+        self.dataset_dir = dataset_dir
+        # Filters run as a query in database and only matching rows are read, instead of loading the table
+        self.push_down = push_down and not dataset_dir
+        self.routes = []
+        self.max_price = 0
+        self.max_duration = 1
 
     def create_db_connection(self):
         """
-        Method to create database connection with mysql.Connector
+        Method to take database connection from the shared connection pool
         :return: boolean True when connected, else False
         """
-        try:
-            self.connection = mysql.connector.connect(**self.db_config)
-            if self.connection.is_connected():
-                return True
-        except Error as e:
-            st.error(f"Error while connecting to MySQL: {e}")
-            return False
+        if self.data_handler.connect():
+            return True
+        st.error("Error while connecting to database, please check the database credentials.")
+        return False
 
     def fetch_bus_data(self):
         """
         Method to retrieve all data from given table, and converts to DataFrame
         :return: boolean True when Success, else False
         """
+        if self.dataset_dir:
+            return self.fetch_dataset()
         try:
-            cursor = self.connection.cursor(dictionary=True)
-            query = f"SELECT * FROM {self.table}"
-            cursor.execute(query)
-            data = cursor.fetchall()
-            self.df = pd.DataFrame(data)
+            data = self.data_handler.execute_query(f"SELECT * FROM {self.table}")
+            self.df = self.to_dataframe(data)
             return True
-        except Error as e:
+        except self.data_handler.DatabaseError as e:
             st.error(f"Error while fetching data: {e}")
             return False
+        finally:
+            self.data_handler.disconnect()  # Connection is given back to the pool
+
+    @staticmethod
+    def to_dataframe(data):
+        """
+        Converts fetched rows to DataFrame with minutes columns and bus class columns.
+        :param data: list of row dictionaries
+        :return: DataFrame
+        """
+        return BusApp.add_bus_class_columns(BusApp.add_minutes_columns(pd.DataFrame(data)))
 
     @staticmethod
-    def format_timedelta(td):
+    def add_minutes_columns(df):
+        """
+        Normalizes times once when data is loaded, so filters, sorting and display do not handle timedelta values
+        row by row. MySQL gives TIME columns as timedelta, SQLite as 'HH:MM:SS' text and Parquet as duration, each
+        is replaced by an integer minutes since midnight column of TIME_COLUMNS. duration text as '05h 30m' is parsed
+        to duration_minutes. Tables loaded by DataHandler have departure_minute and duration_minutes, they are derived
+        here for older tables.
+        :param df: DataFrame of bus data
+        :return: DataFrame with departure_minute, arrival_minute and duration_minutes, without time columns
+        """
+        for column, minutes_column in TIME_COLUMNS.items():
+            if minutes_column in df:
+                df[minutes_column] = pd.to_numeric(df[minutes_column]).astype("Int16")
+            elif column in df:
+                df[minutes_column] = (pd.to_timedelta(df[column]).dt.total_seconds() // 60).astype("Int16")
+        df = df.drop(columns=[column for column in TIME_COLUMNS if column in df])
+        if "duration_minutes" in df:
+            df["duration_minutes"] = pd.to_numeric(df["duration_minutes"]).astype("Int16")
+        elif "duration" in df:
+            parts = df["duration"].astype("string").str.extract(DURATION_PATTERN).apply(pd.to_numeric)
+            minutes = parts[0].fillna(0) * 60 + parts[1].fillna(0)
+            df["duration_minutes"] = minutes.where(parts.notna().any(axis=1)).astype("Int16")
+        return df
+
+    @staticmethod
+    def format_minutes(minutes):
+        """
+        Formats minutes since midnight as HH:MM:SS, for the displayed rows only.
+        :param minutes: Series of minutes
+        :return: Series of time text, NA when minutes are not available
+        """
+        hours = (minutes // 60).astype("string").str.zfill(2)
+        return (hours + ":" + (minutes % 60).astype("string").str.zfill(2) + ":00").where(minutes.notna())
+
+    @staticmethod
+    def add_bus_class_columns(df):
+        """
+        Makes categorical seat_class and boolean is_ac columns when data is loaded, so filters compare values instead
+        of searching bus_type text on every click. Tables loaded by DataHandler have the columns, they are derived
+        here for older tables, classifying each distinct bus_type once.
+        :param df: DataFrame of bus data
+        :return: DataFrame with seat_class and is_ac
+        """
+        if df.empty or "bus_type" not in df:
+            return df
+        if "seat_class" not in df or "is_ac" not in df:
+            bus_types = df["bus_type"].fillna('')
+            distinct = bus_types.unique()
+            df["seat_class"] = bus_types.map({bus_type: classify_seat(bus_type) for bus_type in distinct})
+            df["is_ac"] = bus_types.map({bus_type: classify_ac(bus_type) for bus_type in distinct})
+        df["seat_class"] = pd.Categorical(df["seat_class"], categories=SEAT_CLASSES)
+        df["is_ac"] = df["is_ac"].astype("boolean")  # NA when bus type is neither AC nor NON AC
+        return df
+
+    def load_filter_options(self):
+        """
+        Method to get the values needed by filters, routes, maximum price and maximum duration, for push down mode.
+        They are cached same as loaded data, so they are not queried on every rerun.
+        :return: boolean True when Success, else False
+        """
+        options = self.cached('filter_options', self.fetch_filter_options)
+        if options is None:
+            return False
+        self.routes, self.max_price, self.max_duration = options
+        return True
+
+    def fetch_filter_options(self):
+        """
+        Method to fetch only the values needed by filters from the table
+        :return: tuple of routes, maximum price and maximum duration hours, None when query failed
+        """
+        if not self.create_db_connection():
+            return None
+        try:
+            routes = [row["route"] for row in self.data_handler.execute_query(
+                f"SELECT DISTINCT route FROM {self.table} WHERE route IS NOT NULL ORDER BY route")]
+            limits = self.data_handler.execute_query(
+                f"SELECT MAX(price) AS max_price, MAX(duration_minutes) AS max_duration FROM {self.table}")[0]
+            return routes, limits["max_price"] or 0, self.duration_hours(limits["max_duration"])
+        except self.data_handler.DatabaseError as e:
+            st.error(f"Error while fetching data: {e}")
+            return None
+        finally:
+            self.data_handler.disconnect()
+
+    def cache_key(self):
+        """Key of this app's data in cache"""
+        if self.dataset_dir:
+            return 'parquet', self.dataset_dir
+        return type(self.data_handler).__name__, tuple(sorted(self.data_handler.db_config.items())), self.table
+
+    def data_version(self):
+        """
+        Probes version of data, connection is taken for database tables and given back.
+        :return: version, None when it cannot be probed
+        """
+        if self.dataset_dir:
+            return ParquetDataset(self.dataset_dir).version()
+        if not self.create_db_connection():
+            return None
+        try:
+            return self.data_handler.table_version(self.table)
+        except self.data_handler.DatabaseError as e:
+            st.error(f"Error while checking data version: {e}")
+            return None
+        finally:
+            self.data_handler.disconnect()
+
+    def cached(self, name, load):
+        """
+        Method to get a value derived from data from process wide cache, it is loaded again only when data version
+        changed or cache entry is older than CACHE_TTL. Version is probed at most once in VERSION_CHECK_INTERVAL.
+        :param name: Name of the value in cache
+        :param load: Method loading the value, returning None when loading failed
+        :return: value, None when it could not be loaded
+        """
+        key = self.cache_key() + (name,)
+        now = time.monotonic()
+        with self._cache_lock:
+            entry = self._cache.get(key)
+        if entry and now - entry['loaded_at'] < CACHE_TTL and now - entry['checked_at'] < VERSION_CHECK_INTERVAL:
+            return entry['value']
+
+        version = self.data_version()
+        if version is None:
+            return None
+        if entry and now - entry['loaded_at'] < CACHE_TTL and version == entry['version']:
+            entry['checked_at'] = now
+            return entry['value']
+
+        value = load()
+        if value is not None:
+            with self._cache_lock:
+                self._cache[key] = {'value': value, 'version': version, 'loaded_at': now, 'checked_at': now}
+        return value
+
+    def load_data(self):
+        """
+        Method to get data and its filter index from process wide cache, see cached
+        :return: boolean True when Success, else False
+        """
+        value = self.cached('data', self.read_data)
+        if value is None:
+            return False
+        self.df, self.index = value
+        return True
+
+    def read_data(self):
+        """
+        Method to fetch data and build its filter index, index is built once per loaded data and shared in cache
+        :return: tuple of DataFrame and FilterIndex, None when fetching failed
         """
-        custom method to change timedelta object to readable format as HH:MM:SS
-        :param td: timedelta values to be formatted
-        :return: converted time format as str
+        if not self.dataset_dir and not self.create_db_connection():
+            return None
+        if not self.fetch_bus_data():
+            return None
+        if self.df.empty:
+            return self.df, None
+        # Index keeps its own sorted copy of data, only that copy is kept so data is not held in memory twice
+        index = FilterIndex(self.df)
+        return index.df, index
+
+    def fetch_dataset(self):
         """
-        total_seconds = int(td.total_seconds())
-        hours, remainder = divmod(total_seconds, 3600)
-        minutes, seconds = divmod(remainder, 60)
-        return f"{hours:02}:{minutes:02}:{seconds:02}"
+        Method to read data from Parquet dataset with memory mapping, only the columns used in this page are read
+        :return: boolean True when Success, else False
+        """
+        try:
+            self.df = self.add_bus_class_columns(self.add_minutes_columns(ParquetDataset(self.dataset_dir).read()))
+            return True
+        except (OSError, ValueError) as e:
+            st.error(f"Error while reading dataset: {e}")
+            return False
 
     @staticmethod
-    def to_full_time_format(time_string):
-        return time_string.strip() + ":00"
+    def duration_hours(max_minutes):
+        """
+        Upper bound of Maximum Duration slider.
+        :param max_minutes: longest duration in minutes, None or NA when no duration is known
+        :return: whole hours, at least 2 so slider has a range above its minimum, None when no duration is known
+        """
+        return None if pd.isna(max_minutes) else max(2, math.ceil(max_minutes / 60))
 
     def setup_ui(self):
         """
@@ -70,8 +272,14 @@ class BusApp:
                         f'font-weight: bold;">{title}</p>')
         st.markdown(title_format, unsafe_allow_html=True)
 
-        if not self.create_db_connection() or not self.fetch_bus_data():
+        if self.push_down and not self.load_filter_options():
             return
+        if not self.push_down:
+            if not self.load_data():
+                return
+            self.routes = sorted(self.df["route"].unique())
+            self.max_price = self.df["price"].max()
+            self.max_duration = self.duration_hours(self.df["duration_minutes"].max())
 
         st.subheader("Search and Filter")
         self.setup_filters()
@@ -83,10 +291,10 @@ class BusApp:
         col1, col2, col3 = st.columns(3)
 
         with col1:
-            routes = ["All"] + sorted(self.df["route"].unique())
+            routes = ["All"] + list(self.routes)
             st.selectbox("Select Route", routes, key="route")
 
-            seat_types = ["All", "Sleeper", "Semi Sleeper", "Seater"]
+            seat_types = ["All"] + SEAT_TYPES
             st.selectbox("Select Seat Type", seat_types, key="seat_type")
 
         with col2:
@@ -95,60 +303,33 @@ class BusApp:
 
             st.slider("Minimum Rating", 1.0, 5.0, 1.0, 0.5, key="min_rating")
 
+            if self.max_duration is not None:
+                st.slider("Maximum Duration (hours)", 1, self.max_duration, self.max_duration, key="max_duration")
+
         with col3:
             time_ranges = ["All", "00:00-06:00", "06:00-12:00", "12:00-18:00", "18:00-00:00"]
             st.selectbox("Select Time Range", time_ranges, key="time_range")
 
-            st.number_input("Maximum Fare", min_value=0, step=500, value=int(self.df["price"].max()), key="max_fare")
+            st.number_input("Maximum Fare", min_value=0, step=500, value=int(self.max_price), key="max_fare")
 
         if st.button("Show Buses"):
+            # Results stay on page with clicked filters while they are sorted and paged
+            filters = {key: st.session_state.get(key) for key in FILTER_KEYS}
+            # Slider at its upper bound is no duration filter, so buses without known duration are kept
+            if self.max_duration is None or filters['max_duration'] >= self.max_duration:
+                filters['max_duration'] = None
+            st.session_state.applied_filters = filters
+            st.session_state.show_results = True
+            st.session_state.page = 1
+        if st.session_state.get("show_results"):
             self.filter_and_display_results()
 
     def filter_and_display_results(self):
         """
-        Method for dynamic filtering in database with user inputs
+        Method to display a page of buses matching the applied filters, sorted and paged on server so only the
+        visible rows are sent to browser
         """
-        filtered_df = self.df.copy()
-
-        # Apply filters
-        if st.session_state.route != "All":
-            filtered_df = filtered_df[filtered_df["route"] == st.session_state.route]
-
-        if st.session_state.seat_type != "All":
-            filtered_df = filtered_df[
-                filtered_df["bus_type"].str.contains(st.session_state.seat_type, case=False, na=False)]
-
-        if st.session_state.ac_type != "All":
-            if st.session_state.ac_type == "NON AC":
-                filtered_df = filtered_df[
-                    filtered_df["bus_type"].str.contains(r'\bnon\b', case=False, na=False) |
-                    ~filtered_df["bus_type"].str.contains(r'AC|A/C|HVAC', case=False, na=False)]
-            else:
-                filtered_df = filtered_df[
-                    filtered_df["bus_type"].str.contains(r'^(?=.*\b(?:AC|A/C|HVAC)\b)(?!.*\b(?:NON|Non)\b).*', na=False)]
-
-        filtered_df = filtered_df[filtered_df["rating"] >= st.session_state.min_rating]
-
-        if st.session_state.time_range != "All":
-            start_time, end_time = st.session_state.time_range.split("-")
-            start_time = pd.to_timedelta(self.to_full_time_format(start_time))
-            end_time = pd.to_timedelta(self.to_full_time_format(end_time))
-
-            if start_time < end_time:
-                filtered_df = filtered_df[
-                    (filtered_df["departure_time"] >= start_time) & (filtered_df["departure_time"] < end_time)]
-            else:
-                filtered_df = filtered_df[
-                    (filtered_df["departure_time"] >= start_time) | (filtered_df["departure_time"] < end_time)]
-
-        filtered_df = filtered_df[filtered_df["price"] <= st.session_state.max_fare]
-
-        # Format times
-        filtered_df['departure_time'] = filtered_df['departure_time'].apply(self.format_timedelta)
-        filtered_df['arrival_time'] = filtered_df['arrival_time'].apply(self.format_timedelta)
-
-        # Adding clickable URL
-        filtered_df['url'] = filtered_df['url'].apply(lambda x: f'<a href="{x}" target="_blank">Click here</a>')
+        filters = st.session_state.applied_filters
 
         # Display results
         sub_header = "Available Buses"
@@ -156,10 +337,83 @@ class BusApp:
                              f'font-weight: bold;">{sub_header}</p>')
         st.markdown(sub_header_format, unsafe_allow_html=True)
 
-        if not filtered_df.empty:
-            st.markdown(filtered_df.to_html(escape=False, index=False), unsafe_allow_html=True)
-        else:
+        total = self.count_buses(filters)
+        if total is None:
+            return
+        if not total:
             st.info("No buses found matching your criteria. Please try different filters.")
+            return
+
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            sort_by = SORT_OPTIONS[st.selectbox("Sort By", list(SORT_OPTIONS), key="sort_by")]
+        with col2:
+            order = st.radio("Order", ["Ascending", "Descending"], horizontal=True, key="sort_order")
+            descending = order == "Descending"
+        with col3:
+            page_size = st.selectbox("Rows per Page", PAGE_SIZES, key="page_size")
+        with col4:
+            page_count = -(-total // page_size)
+            st.session_state.page = min(st.session_state.get("page", 1), page_count)
+            page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, step=1, key="page")
+
+        offset = (page - 1) * page_size
+        page_df = self.fetch_buses(filters, sort_by, descending, offset, page_size)
+        if page_df is None:
+            return
+
+        # Format times of page rows only, columns are shown in scraped data order
+        page_df = page_df.assign(**{column: self.format_minutes(page_df[minutes_column])
+                                    for column, minutes_column in TIME_COLUMNS.items()})
+        page_df = page_df[[column for column in DATA_COLUMNS if column in page_df]]
+
+        st.dataframe(page_df, hide_index=True, use_container_width=True,
+                     column_config={"url": st.column_config.LinkColumn("url", display_text="Click here")})
+        st.caption(f"Showing {offset + 1}-{offset + len(page_df)} of {total} buses")
+
+    def count_buses(self, filters):
+        """
+        Method to count buses matching filters, with a count query in push down mode, else with filter index
+        :param filters: dictionary of filter values
+        :return: count of matching buses, None when query failed
+        """
+        if not self.push_down:
+            self.matching_rows = self.index.query_rows(filters) if self.index is not None else []
+            return len(self.matching_rows)
+        query, params = build_count_query(self.table, filters, self.data_handler.PLACEHOLDER)
+        if not self.create_db_connection():
+            return None
+        try:
+            return self.data_handler.execute_query(query, params)[0]["bus_count"]
+        except self.data_handler.DatabaseError as e:
+            st.error(f"Error while fetching data: {e}")
+            return None
+        finally:
+            self.data_handler.disconnect()
+
+    def fetch_buses(self, filters, sort_by, descending, offset, limit):
+        """
+        Method to fetch a sorted page of buses matching filters, called after count_buses
+        :param filters: dictionary of filter values
+        :param sort_by: one of SORT_OPTIONS values
+        :param descending: Boolean flag to sort by descending values
+        :param offset: Count of matching buses to skip
+        :param limit: Count of buses in page
+        :return: DataFrame of page, None when query failed
+        """
+        if not self.push_down:
+            return self.index.page(self.index.sort_rows(self.matching_rows, sort_by, descending), offset, limit)
+        query, params = build_filter_query(self.table, filters, self.data_handler.PLACEHOLDER, order_by=(sort_by,),
+                                           limit=limit, offset=offset, descending=descending)
+        if not self.create_db_connection():
+            return None
+        try:
+            return self.to_dataframe(self.data_handler.execute_query(query, params))
+        except self.data_handler.DatabaseError as e:
+            st.error(f"Error while fetching data: {e}")
+            return None
+        finally:
+            self.data_handler.disconnect()
 
     def run(self):
         self.setup_ui()
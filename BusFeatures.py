@@ -0,0 +1,100 @@
+import re
+from datetime import date, datetime
+from functools import lru_cache
+
+# Seat types offered in Select Bus filters
+SEAT_TYPES = ["Sleeper", "Semi Sleeper", "Seater"]
+
+# Seat classes of bus_type, named so that a seat type filter matches a class when the seat type is part of its name,
+# same as matching the seat type in bus_type text
+SEAT_CLASSES = ["Seater", "Sleeper", "Semi Sleeper", "Seater/Sleeper", "Seater/Semi Sleeper", "Other"]
+
+AC_PATTERN = re.compile(r'^(?=.*\b(?:AC|A/C|HVAC)\b)(?!.*\b(?:NON|Non)\b).*')
+NON_PATTERN = re.compile(r'\bnon\b', re.IGNORECASE)
+AC_MENTION_PATTERN = re.compile(r'AC|A/C|HVAC', re.IGNORECASE)
+DURATION_PATTERN = re.compile(r'^\s*(?:(\d+)\s*h)?\s*(?:(\d+)\s*m)?\s*$', re.IGNORECASE)
+TIME_PATTERN = re.compile(r'^\s*(\d{1,2}):(\d{2})(?::\d{2})?\s*$')
+
+
+@lru_cache(maxsize=4096)
+def classify_seat(bus_type):
+    """
+    Seat class of a bus type.
+    :param bus_type: bus_type text of scraped data
+    :return: one of SEAT_CLASSES
+    """
+    text = (bus_type or '').lower()
+    if 'semi sleeper' in text:
+        berth = 'Semi Sleeper'
+    elif 'sleeper' in text:
+        berth = 'Sleeper'
+    else:
+        berth = None
+    if 'seater' in text:
+        return f"Seater/{berth}" if berth else 'Seater'
+    return berth or 'Other'
+
+
+def seat_classes_for(seat_type):
+    """
+    Seat classes matching a seat type filter.
+    :param seat_type: one of SEAT_TYPES
+    :return: list of seat classes
+    """
+    return [seat_class for seat_class in SEAT_CLASSES if seat_type in seat_class]
+
+
+@lru_cache(maxsize=4096)
+def classify_ac(bus_type):
+    """
+    AC type of a bus type. Text such as 'non AC' matched both AC and NON AC text filters used before, as AC filter
+    only excluded 'NON' and 'Non', it is AC here as AC_PATTERN is checked first.
+    :param bus_type: bus_type text of scraped data
+    :return: True for AC, False for NON AC, None when bus type is neither, e.g. 'Volvo Coach'
+    """
+    if not bus_type:
+        return False
+    if AC_PATTERN.match(bus_type):
+        return True
+    if NON_PATTERN.search(bus_type) or not AC_MENTION_PATTERN.search(bus_type):
+        return False
+    return None
+
+
+def duration_to_minutes(duration):
+    """
+    Converts duration text as '05h 30m' to minutes.
+    :param duration: duration text of scraped data
+    :return: minutes, None when text is not a duration
+    """
+    match = DURATION_PATTERN.match(duration or '')
+    if not match or not any(match.groups()):
+        return None
+    hours, minutes = match.groups()
+    return int(hours or 0) * 60 + int(minutes or 0)
+
+
+def time_to_minutes(time_text):
+    """
+    Converts time text as '21:30' to minutes since midnight.
+    :param time_text: time text of scraped data
+    :return: minutes, None when text is not a time
+    """
+    match = TIME_PATTERN.match(time_text or '')
+    if not match:
+        return None
+    return int(match.group(1)) * 60 + int(match.group(2))
+
+
+def parse_journey_date(journey_date):
+    """
+    Converts date of scraped data to a date.
+    :param journey_date: date, or text in '%d-%b-%Y' format used by scraper
+    :return: date, None when not given
+    """
+    if isinstance(journey_date, datetime):
+        return journey_date.date()
+    if journey_date is None or isinstance(journey_date, date):
+        return journey_date
+    return datetime.strptime(journey_date, "%d-%b-%Y").date()
+
@@ -1,4 +1,161 @@
+import os
+import queue
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import date, datetime
 import mysql.connector
+import pandas as pd
+from mysql.connector import pooling
+from BusFeatures import classify_ac, classify_seat, duration_to_minutes, parse_journey_date, time_to_minutes
+
+# Columns of scraped data, in the order of a scraped data row
+DATA_COLUMNS = ['route', 'url', 'bus_id', 'bus_type', 'departure_time', 'duration', 'arrival_time', 'rating', 'price',
+                'seats_available']
+TIME_COLUMN_INDEXES = [DATA_COLUMNS.index('departure_time'), DATA_COLUMNS.index('arrival_time')]
+# Columns derived from scraped data when it is inserted, so filters do not need to parse text
+DERIVED_COLUMNS = ['journey_date', 'is_ac', 'seat_class', 'duration_minutes', 'departure_minute']
+TABLE_COLUMNS = DATA_COLUMNS + DERIVED_COLUMNS
+# Natural key of a journey, rows are upserted on it in 'upsert' mode
+UPSERT_KEY_NAME = 'uk_journey'
+UPSERT_KEY_COLUMNS = ['journey_date', 'route', 'bus_id', 'bus_type', 'departure_time']
+
+POOL_SIZE = 5
+# Storage backends of create_data_handler
+BACKENDS = ['mysql', 'sqlite']
+# Table of generation counters incremented when data of a table changes, for readers caching table data
+VERSIONS_TABLE = 'data_versions'
+
+# Secondary indexes of bus data table, name to indexed columns
+INDEX_DEFINITIONS = {
+    'idx_route': 'route, departure_minute',
+    'idx_journey_date': 'journey_date, route',
+    'idx_departure': 'departure_minute',
+    'idx_price': 'price',
+    'idx_rating': 'rating',
+    'idx_bus_class': 'seat_class, is_ac',
+}
+
+
+def to_sql_time(value):
+    """
+    Converts scraped 'HH:MM' time text to 'HH:MM:SS', parsed in client instead of STR_TO_DATE in database.
+    :param value: scraped time text
+    :return: time text, None when value is not a time
+    """
+    if value and re.fullmatch(r'\d{1,2}:\d{2}', value.strip()):
+        return value.strip() + ":00"
+    return None
+
+
+def prepare_row(row, journey_date=None):
+    """
+    Converts a scraped data row into a row of database values, with derived columns added.
+    :param row: scraped data row
+    :param journey_date: date of the scraped data
+    :return: tuple of values in TABLE_COLUMNS order
+    """
+    values = list(row)
+    for index in TIME_COLUMN_INDEXES:
+        values[index] = to_sql_time(values[index])
+    bus_type = row[DATA_COLUMNS.index('bus_type')]
+    is_ac = classify_ac(bus_type)
+    values += [
+        parse_journey_date(journey_date),
+        None if is_ac is None else int(is_ac),
+        classify_seat(bus_type),
+        duration_to_minutes(row[DATA_COLUMNS.index('duration')]),
+        time_to_minutes(row[DATA_COLUMNS.index('departure_time')]),
+    ]
+    return tuple(values)
+
+
+def keyed_rows(data):
+    """
+    Rows of scraped data that have a departure time. departure_time is the only journey key column scraped data can
+    lack, and rows without it cannot be matched with the rows of an earlier scrape, so they are not upserted.
+    :param data: scraped data
+    :return: list of rows
+    """
+    departure = DATA_COLUMNS.index('departure_time')
+    return [row for row in data if to_sql_time(row[departure]) is not None]
+
+
+def to_tsv_line(values):
+    """
+    Converts database values into a line of LOAD DATA default format, tab separated with \\N for NULL.
+    :param values: values of a row
+    :return: line text
+    """
+    fields = []
+    for value in values:
+        if value is None:
+            fields.append('\\N')
+        else:
+            fields.append(str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n'))
+    return '\t'.join(fields) + '\n'
+
+
+class ConnectionPool:
+    """
+    Pool of MySQL connections for one set of credentials, shared by everything in the process that connects with
+    them, so connections are not opened for every query or Streamlit rerun. Use for_config to get the shared pool.
+    :param db_config: Connection arguments of mysql.connector
+    :param size: Count of connections in pool (default: POOL_SIZE)
+    """
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+    def __init__(self, db_config, size=POOL_SIZE):
+        self.pool = pooling.MySQLConnectionPool(pool_name=f"bus_data_{len(self._pools)}", pool_size=size,
+                                                pool_reset_session=True, **db_config)
+        self._slots = threading.BoundedSemaphore(size)
+
+    @classmethod
+    def for_config(cls, db_config, size=POOL_SIZE):
+        """
+        Returns the pool of given credentials, created at first use.
+        :param db_config: Connection arguments of mysql.connector
+        :param size: Count of connections in pool, used only when pool is created (default: POOL_SIZE)
+        :return: ConnectionPool instance
+        """
+        key = tuple(sorted(db_config.items()))
+        with cls._pools_lock:
+            if key not in cls._pools:
+                cls._pools[key] = cls(db_config, size)
+            return cls._pools[key]
+
+    def checkout(self, timeout=30):
+        """
+        Takes a healthy connection from pool, waits when all connections are in use.
+        :param timeout: Seconds to wait for a free connection (default: 30)
+        :return: pooled connection, to be given back with release
+        """
+        if not self._slots.acquire(timeout=timeout):
+            raise pooling.PoolError(f"No free connection in pool after {timeout} seconds")
+        try:
+            connection = self.pool.get_connection()
+        except mysql.connector.Error:
+            self._slots.release()
+            raise
+        try:
+            connection.ping(reconnect=True, attempts=2, delay=0)  # Connections closed by server are reopened
+        except mysql.connector.Error:
+            self.release(connection)
+            raise
+        return connection
+
+    def release(self, connection):
+        """
+        Gives a connection back to pool.
+        :param connection: connection taken with checkout
+        """
+        try:
+            connection.close()  # Closing a pooled connection returns it to pool
+        finally:
+            self._slots.release()
 
 
 class DataHandler:
@@ -8,25 +165,42 @@ class DataHandler:
     :param user: Username for connecting to the MySQL database.
     :param password: Password for connecting to the MySQL database.
     :param database: Name of the database to connect.
+    :param allow_local_infile: Boolean flag to allow LOAD DATA LOCAL INFILE, needed by bulk_load with local_infile.
     """
-    def __init__(self, host, user, password, database):
+    # Parameter marker of queries and errors raised by the database driver
+    PLACEHOLDER = '%s'
+    DatabaseError = mysql.connector.Error
+    # Whether rows can be loaded with LOAD DATA LOCAL INFILE
+    LOCAL_INFILE = True
+    GENERATION_QUERY = (f"INSERT INTO {VERSIONS_TABLE} (table_name, generation) VALUES (%s, 1) "
+                        f"ON DUPLICATE KEY UPDATE generation = generation + 1")
+
+    def __init__(self, host, user, password, database, allow_local_infile=False):
         self.db_config = {
             'host': host,
             'user': user,
             'password': password,
-            'database': database
+            'database': database,
+            'allow_local_infile': allow_local_infile
         }
+        self.pool = None
         self.connection = None
         self.cursor = None
 
     def connect(self):
-        """Establish a connection to the MySQL database."""
+        """
+        Take a connection to the MySQL database from the shared pool of the credentials.
+        :return: boolean True when connected, else False
+        """
         try:
-            self.connection = mysql.connector.connect(**self.db_config)
+            self.pool = ConnectionPool.for_config(self.db_config)
+            self.connection = self.pool.checkout()
             self.cursor = self.connection.cursor()
             print("Connected to the database.")
+            return True
         except mysql.connector.Error as error:
             print(f"Error connecting to database: {error}")
+            return False
 
     def execute_query(self, query, params=None):
         """
@@ -36,6 +210,7 @@ class DataHandler:
         :param params: Optional query parameters.
         :return: Result of the query if it's a SELECT, otherwise return affected rows.
         """
+        cursor = None
         try:
             cursor = self.connection.cursor(dictionary=True)  # Use dictionary cursor for easier result parsing
             cursor.execute(query, params)
@@ -45,28 +220,141 @@ class DataHandler:
                 result = cursor.fetchall()
                 return result
 
-        except mysql.connector.Error as e:
+        except self.DatabaseError as e:
             print(f"Error executing query: {e}")
             self.connection.rollback()
             raise e
         finally:
-            self.cursor.close()
+            if cursor:
+                cursor.close()
+
+    def streaming_cursor(self):
+        """
+        Cursor reading rows from server as they are fetched, instead of buffering the whole result.
+        :return: unbuffered cursor
+        """
+        return self.connection.cursor(buffered=False)
+
+    def discard_results(self):
+        """Reads and discards rows left of an unbuffered query, so the connection can run the next query."""
+        if self.connection.unread_result:
+            self.connection.consume_results()
+
+    def iter_query(self, query, params=None, chunk_size=10000, limit=None, as_dataframe=False):
+        """
+        Execute a SELECT query and yield its result in chunks, only a chunk of rows is kept in memory at a time.
+
+        :param query: SQL SELECT query to execute.
+        :param params: Optional query parameters.
+        :param chunk_size: Count of rows in a chunk (default: 10000).
+        :param limit: Maximum count of rows to be read, all rows when not given.
+        :param as_dataframe: Boolean flag to yield DataFrame chunks instead of lists of tuples (default: False)
+        :return: generator of chunks
+        """
+        if limit is not None:
+            query = f"SELECT * FROM ({query.strip().rstrip(';')}) AS limited_query LIMIT {int(limit)}"
+        cursor = self.streaming_cursor()
+        try:
+            cursor.execute(query, self.prepare_values(params))
+            columns = [column[0] for column in cursor.description]
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield pd.DataFrame.from_records(rows, columns=columns) if as_dataframe else rows
+        except self.DatabaseError as e:
+            print(f"Error executing query: {e}")
+            raise e
+        finally:
+            self.discard_results()  # Generator closed before all rows were read
+            cursor.close()
+
+    def probe_table(self, table_name):
+        """
+        Checks whether a table is present and counts its rows, without reading them.
+        :param table_name: Table Name in database
+        :return: count of rows, None when table is not present
+        """
+        if not self.table_exists(table_name):
+            return None
+        self.cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
+        return self.cursor.fetchone()[0]
+
+    def create_versions_table(self):
+        """Creates VERSIONS_TABLE when not present, called once before a load bumps generations."""
+        try:
+            self.cursor.execute(f"CREATE TABLE IF NOT EXISTS {VERSIONS_TABLE} "
+                                f"(table_name VARCHAR(64) PRIMARY KEY, generation BIGINT NOT NULL)")
+            self.connection.commit()
+        except self.DatabaseError as error:
+            print(f"Error creating '{VERSIONS_TABLE}': {error}")
+
+    def bump_generation(self, table_name):
+        """
+        Increments generation counter of a table in VERSIONS_TABLE, called whenever data of the table changes so
+        readers caching it know to reload. VERSIONS_TABLE is created by create_versions_table.
+        :param table_name: Table Name in database
+        """
+        try:
+            self.cursor.execute(self.GENERATION_QUERY, (table_name,))
+            self.connection.commit()
+        except self.DatabaseError as error:
+            print(f"Error updating generation of '{table_name}': {error}")
+
+    def table_generation(self, table_name):
+        """
+        Generation counter of a table.
+        :param table_name: Table Name in database
+        :return: generation, 0 when table was never written by loader
+        """
+        try:
+            self.cursor.execute(f"SELECT generation FROM {VERSIONS_TABLE} WHERE table_name = {self.PLACEHOLDER}",
+                                (table_name,))
+        except self.DatabaseError:  # Versions table is created by first load
+            return 0
+        row = self.cursor.fetchone()
+        return row[0] if row else 0
+
+    def table_version(self, table_name):
+        """
+        Cheap probe of a table's data version, changes whenever the table is written. Generation counter is combined
+        with UPDATE_TIME of information_schema, so writes by other tools are also seen. MySQL 8 caches table statistics
+        of information_schema for information_schema_stats_expiry seconds (default 86400), so caching is turned off
+        for the session first. Older servers without the variable read UPDATE_TIME directly.
+        :param table_name: Table Name in database
+        :return: tuple of version values, to be compared with an earlier version
+        """
+        generation = self.table_generation(table_name)
+        try:
+            self.cursor.execute("SET SESSION information_schema_stats_expiry = 0")
+        except self.DatabaseError:  # MySQL before 8.0 and MariaDB do not cache statistics
+            pass
+        self.cursor.execute("SELECT UPDATE_TIME, CREATE_TIME FROM information_schema.TABLES "
+                            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s", (table_name,))
+        return (generation,) + tuple(self.cursor.fetchone() or ())
 
     def disconnect(self):
-        """Close the connection to the MySQL database."""
-        if self.connection and self.connection.is_connected():
-            self.cursor.close()
-            self.connection.close()
+        """Give the connection back to the pool."""
+        if self.connection:
+            try:
+                self.cursor.close()
+            finally:
+                self.pool.release(self.connection)
+                self.connection = None
+                self.cursor = None
             print("Database connection closed.")
 
-    def drop_and_create_table(self, table_name):
+    def drop_and_create_table(self, table_name, with_indexes=True):
         """
         Drop the table if it exists and create a new table.
         :param table_name:  Table Name in database to be Created.
+        :param with_indexes: Boolean flag to create secondary indexes with the table, else they are created later
+         with create_indexes (default: True)
         """
         try:
             self.cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
             print(f"Table '{table_name}' dropped.")
+            indexes = ''.join(f", INDEX {name} ({columns})" for name, columns in INDEX_DEFINITIONS.items())
             create_query = f"""
                 CREATE TABLE {table_name} (
                     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -79,43 +367,870 @@ class DataHandler:
                     arrival_time TIME,
                     rating FLOAT,
                     price DECIMAL(10, 2),
-                    seats_available INT
+                    seats_available INT,
+                    journey_date DATE,
+                    is_ac TINYINT(1),
+                    seat_class VARCHAR(20),
+                    duration_minutes SMALLINT,
+                    departure_minute SMALLINT,
+                    refreshed_at DATETIME(6) DEFAULT CURRENT_TIMESTAMP(6)
+                    {indexes if with_indexes else ''}
                 );
             """
             self.cursor.execute(create_query)
             print(f"Table '{table_name}' created.")
-        except mysql.connector.Error as error:
+        except self.DatabaseError as error:
             print(f"Error during table creation: {error}")
 
-    def insert_data(self, table_name, data):
+    def create_indexes(self, table_name):
+        """
+        Creates secondary indexes of a table created without them, in a single statement.
+        :param table_name: Table Name in database
+        """
+        additions = ', '.join(f"ADD INDEX {name} ({columns})" for name, columns in INDEX_DEFINITIONS.items())
+        self.cursor.execute(f"ALTER TABLE {table_name} {additions}")
+        print(f"Indexes of '{table_name}' created.")
+
+    def table_exists(self, table_name):
+        """
+        Checks whether a table is present in the database.
+        :param table_name: Table Name in database
+        :return: boolean True when present, else False
+        """
+        self.cursor.execute("SELECT COUNT(*) FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() "
+                            "AND TABLE_NAME = %s", (table_name,))
+        return self.cursor.fetchone()[0] > 0
+
+    def table_columns(self, table_name):
+        """
+        Column names of a table.
+        :param table_name: Table Name in database
+        :return: list of column names
+        """
+        self.cursor.execute("SELECT COLUMN_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() "
+                            "AND TABLE_NAME = %s", (table_name,))
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def server_time(self):
+        """
+        Current time of the database server, upserted rows are stamped with it so they compare with refreshed_at
+        defaults set by the server.
+        :return: datetime
+        """
+        self.cursor.execute("SELECT NOW(6)")
+        return self.cursor.fetchone()[0]
+
+    def check_upsert_table(self, table_name):
+        """
+        Checks that the unique journey key can be added to a table created by an older version.
+        :param table_name: Table Name in database
+        :raise ValueError: when journey key columns are missing, or a journey has more than one row
+        """
+        missing = [column for column in UPSERT_KEY_COLUMNS if column not in self.table_columns(table_name)]
+        if missing:
+            raise ValueError(f"Table '{table_name}' has no {', '.join(missing)} column, as created by an older "
+                             f"version. Load it once with 'swap' or 'replace' refresh before using 'upsert'.")
+        keyed = ' AND '.join(f"{column} IS NOT NULL" for column in UPSERT_KEY_COLUMNS)
+        self.cursor.execute(f"SELECT COUNT(*) FROM (SELECT 1 FROM {table_name} WHERE {keyed} "
+                            f"GROUP BY {', '.join(UPSERT_KEY_COLUMNS)} HAVING COUNT(*) > 1) AS duplicates")
+        duplicates = self.cursor.fetchone()[0]
+        if duplicates:
+            raise ValueError(f"Table '{table_name}' has {duplicates} journeys with more than one row, so unique key "
+                             f"'{UPSERT_KEY_NAME}' cannot be added. Load it once with 'swap' or 'replace' refresh "
+                             f"before using 'upsert'.")
+
+    def ensure_upsert_table(self, table_name):
+        """
+        Creates the table when not present and adds the refreshed_at column and unique journey key needed for upserts,
+        for tables created by an older version.
+        :param table_name: Table Name in database
+        :raise ValueError: when unique journey key cannot be added, see check_upsert_table
+        """
+        if not self.table_exists(table_name):
+            self.drop_and_create_table(table_name)
+        self.cursor.execute("SELECT COUNT(*) FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE() "
+                            "AND TABLE_NAME = %s AND INDEX_NAME = %s", (table_name, UPSERT_KEY_NAME))
+        if self.cursor.fetchone()[0] == 0:
+            self.check_upsert_table(table_name)
+            self.cursor.execute(f"ALTER TABLE {table_name} ADD UNIQUE KEY {UPSERT_KEY_NAME} "
+                                f"({', '.join(UPSERT_KEY_COLUMNS)})")
+            print(f"Unique key '{UPSERT_KEY_NAME}' added to '{table_name}'.")
+        if 'refreshed_at' not in self.table_columns(table_name):
+            self.cursor.execute(f"ALTER TABLE {table_name} "
+                                f"ADD COLUMN refreshed_at DATETIME(6) DEFAULT CURRENT_TIMESTAMP(6)")
+
+    def delete_stale_rows(self, table_name, journey_date, routes, refreshed_at, chunk_size=500):
+        """
+        Deletes rows of given routes and date not refreshed by the current upsert, i.e. buses no longer listed.
+        :param table_name: Table Name in database
+        :param journey_date: Date of the scraped data.
+        :param routes: Route Names that were scraped
+        :param refreshed_at: Time stamp given to rows of the current upsert
+        :param chunk_size: Count of routes in a single delete statement (default: 500)
+        :return: count of rows deleted
+        """
+        routes = sorted(routes)
+        deleted = 0
+        for start in range(0, len(routes), chunk_size):
+            chunk = routes[start:start + chunk_size]
+            marker = self.PLACEHOLDER
+            self.cursor.execute(
+                f"DELETE FROM {table_name} WHERE journey_date = {marker} "
+                f"AND route IN ({', '.join([marker] * len(chunk))}) AND refreshed_at < {marker}",
+                self.prepare_values((parse_journey_date(journey_date), *chunk, refreshed_at)))
+            deleted += self.cursor.rowcount
+            self.connection.commit()
+        print(f"{deleted} stale rows deleted from '{table_name}'.")
+        return deleted
+
+    @staticmethod
+    def staging_table_name(table_name):
+        """Name of the table new data is loaded into before it replaces the table"""
+        return f"{table_name}_staging"
+
+    @staticmethod
+    def previous_table_name(table_name):
+        """Name of the table keeping the replaced data, for rollback"""
+        return f"{table_name}_previous"
+
+    def prepare_staging_table(self, table_name):
+        """
+        Creates an empty staging table for a table, without secondary indexes for faster loading.
+        :param table_name: Table Name in database to be replaced.
+        :return: staging table name
+        """
+        staging_table = self.staging_table_name(table_name)
+        self.drop_and_create_table(staging_table, with_indexes=False)
+        return staging_table
+
+    def swap_staging_table(self, table_name):
+        """
+        Replaces a table by its loaded staging table with a single atomic RENAME TABLE, so readers never see an
+        empty or partial table. Replaced table is kept as previous table for rollback.
+        :param table_name: Table Name in database to be replaced.
+        """
+        staging_table = self.staging_table_name(table_name)
+        previous_table = self.previous_table_name(table_name)
+        self.create_indexes(staging_table)
+
+        # Reading all rows loads the new table in buffer pool before readers are switched to it
+        self.cursor.execute(f"CHECKSUM TABLE {staging_table}")
+        self.cursor.fetchall()
+
+        self.cursor.execute(f"DROP TABLE IF EXISTS {previous_table}")
+        if self.table_exists(table_name):
+            self.cursor.execute(f"RENAME TABLE {table_name} TO {previous_table}, {staging_table} TO {table_name}")
+        else:
+            self.cursor.execute(f"RENAME TABLE {staging_table} TO {table_name}")
+        self.bump_generation(table_name)
+        print(f"Table '{table_name}' replaced by '{staging_table}'.")
+
+    def rollback_table(self, table_name):
+        """
+        Swaps a table with its previous table, calling it again restores the replaced data.
+        :param table_name: Table Name in database to be rolled back.
+        """
+        staging_table = self.staging_table_name(table_name)
+        previous_table = self.previous_table_name(table_name)
+        if not self.table_exists(previous_table):
+            print(f"No previous data to restore for '{table_name}'.")
+            return
+        self.create_versions_table()
+        self.cursor.execute(f"DROP TABLE IF EXISTS {staging_table}")
+        self.cursor.execute(f"RENAME TABLE {table_name} TO {staging_table}, {previous_table} TO {table_name}, "
+                            f"{staging_table} TO {previous_table}")
+        self.bump_generation(table_name)
+        print(f"Table '{table_name}' restored from '{previous_table}'.")
+
+    def insert_data(self, table_name, data, journey_date=None, refreshed_at=None):
         """
         Insert data from a nested list into the specified table.
         :param table_name:  Table Name in database to be inserted.
         :param data:  Data to be inserted in Table.
+        :param journey_date: Date of the scraped data.
+        :param refreshed_at: When given, rows are upserted on journey key and stamped with this time.
+        :return: boolean True when inserted, else False
         """
 
         try:
-            insert_query = f"""
-                INSERT INTO {table_name} (route, url, bus_id, bus_type, departure_time, duration, arrival_time, rating, 
-                price, seats_available)
-                VALUES (%s, %s, %s, %s, STR_TO_DATE(%s, '%H:%i'), %s, STR_TO_DATE(%s, '%H:%i'), %s, %s, %s)
-            """
-            self.cursor.executemany(insert_query, data)
+            self.cursor.executemany(self.insert_query(table_name, refreshed_at is not None),
+                                    self.prepare_rows(data, journey_date, refreshed_at))
             self.connection.commit()
             print("Data inserted successfully!")
-        except mysql.connector.Error as error:
+            return True
+        except self.DatabaseError as error:
+            self.connection.rollback()
             print(f"Error inserting data: {error}")
+            return False
+
+    @staticmethod
+    def prepare_values(values):
+        """
+        Converts query values to types accepted by the database driver, connector accepts all values as they are.
+        :param values: tuple of values
+        :return: tuple of values
+        """
+        return values
+
+    def prepare_rows(self, data, journey_date=None, refreshed_at=None):
+        """
+        Converts scraped data into rows of database values, with time stamp added for upserts.
+        :param data: scraped data
+        :param journey_date: Date of the scraped data.
+        :param refreshed_at: Time stamp of an upsert
+        :return: list of tuples
+        """
+        if refreshed_at is None:
+            return [self.prepare_values(prepare_row(row, journey_date)) for row in data]
+        return [self.prepare_values(prepare_row(row, journey_date) + (refreshed_at,)) for row in data]
+
+    @staticmethod
+    def insert_query(table_name, upsert=False):
+        """
+        Insert query of a scraped data row.
+        :param table_name: Table Name in database to be inserted.
+        :param upsert: Boolean flag to update the existing row of the same journey key (default: False)
+        :return: query text
+        """
+        if not upsert:
+            return f"""
+                INSERT INTO {table_name} ({', '.join(TABLE_COLUMNS)})
+                VALUES ({', '.join(['%s'] * len(TABLE_COLUMNS))})
+            """
+        columns = TABLE_COLUMNS + ['refreshed_at']
+        updates = ', '.join(f"{column} = VALUES({column})" for column in columns if column not in UPSERT_KEY_COLUMNS)
+        return f"""
+            INSERT INTO {table_name} ({', '.join(columns)})
+            VALUES ({', '.join(['%s'] * len(columns))})
+            ON DUPLICATE KEY UPDATE {updates}
+        """
+
+    def load_data_infile(self, table_name, rows):
+        """
+        Loads rows with LOAD DATA LOCAL INFILE, rows are written in a temporary file for the connector to send.
+        :param table_name: Table Name in database to be inserted.
+        :param rows: rows of database values
+        """
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', newline='', suffix='.tsv', delete=False) as file:
+            file.writelines(to_tsv_line(row) for row in rows)
+        try:
+            self.cursor.execute(
+                f"LOAD DATA LOCAL INFILE %s INTO TABLE {table_name} CHARACTER SET utf8mb4 ({', '.join(TABLE_COLUMNS)})",
+                (file.name,))
+        finally:
+            os.remove(file.name)
+
+    def check_local_infile(self, local_infile):
+        """
+        Rejects local_infile for backends without LOAD DATA LOCAL INFILE.
+        :param local_infile: Boolean flag to load with LOAD DATA LOCAL INFILE
+        :raise ValueError: when local_infile is given and not supported
+        """
+        if local_infile and not self.LOCAL_INFILE:
+            raise ValueError(f"local_infile cannot be used with {type(self).__name__}")
+
+    def bulk_load(self, table_name, data, chunk_size=1000, local_infile=False, journey_date=None, refreshed_at=None):
+        """
+        Insert data in chunks, every chunk in its own transaction so a failing chunk does not discard the others.
+        :param table_name:  Table Name in database to be inserted.
+        :param data:  Data to be inserted in Table.
+        :param chunk_size: Count of rows in a chunk (default: 1000).
+        :param local_infile: Boolean flag to load chunks with LOAD DATA LOCAL INFILE instead of INSERT, needs
+         allow_local_infile in DataHandler and local_infile enabled in server (default: False)
+        :param journey_date: Date of the scraped data.
+        :param refreshed_at: When given, rows are upserted on journey key and stamped with this time, cannot be used
+         with local_infile.
+        :return: count of rows inserted
+        """
+        self.check_local_infile(local_infile)
+        if local_infile and refreshed_at is not None:
+            raise ValueError("Upsert cannot be used with local_infile")
+        inserted = 0
+        failed_chunks = 0
+        for start in range(0, len(data), chunk_size):
+            rows = self.prepare_rows(data[start:start + chunk_size], journey_date, refreshed_at)
+            started = time.perf_counter()
+            try:
+                if local_infile:
+                    self.load_data_infile(table_name, rows)
+                else:
+                    self.cursor.executemany(self.insert_query(table_name, refreshed_at is not None), rows)
+                self.connection.commit()
+            except self.DatabaseError as error:
+                self.connection.rollback()
+                failed_chunks += 1
+                print(f"Error inserting rows {start + 1}-{start + len(rows)}: {error}")
+                continue
+            elapsed = time.perf_counter() - started
+            inserted += len(rows)
+            print(f"Inserted rows {start + 1}-{start + len(rows)} at {len(rows) / max(elapsed, 1e-6):.0f} rows/s")
+        print(f"{inserted} rows inserted, {failed_chunks} chunks failed.")
+        return inserted
 
-    def add_scraped_data_to_database(self, table_name, data):
+    def add_scraped_data_to_database(self, table_name, data, chunk_size=1000, local_infile=False, mode='swap',
+                                     journey_date=None, routes=None, dataset=None):
         """
         Custom method to add scraped data in Database using MYSQL Connector.
         :param table_name: Table Name in database to be added.
         :param data: Data to be inserted in Database.
+        :param chunk_size: Count of rows inserted in a transaction (default: 1000).
+        :param local_infile: Boolean flag to load with LOAD DATA LOCAL INFILE (default: False)
+        :param mode: 'swap' to load into a staging table and replace the table atomically when all rows are loaded,
+         'replace' to drop and create the table before loading, 'upsert' to update only the scraped routes of the
+         journey date, keeping the rest of the table (default: 'swap')
+        :param journey_date: Date of the scraped data, date or text in '%d-%b-%Y' format, needed for 'upsert'.
+        :param routes: Route Names that were scraped, for 'upsert'. Rows of these routes and date that are not in
+         data are deleted. Routes in data are used when not given.
+        :param dataset: ParquetDataset where data is also written once the table is refreshed, needs journey_date
+         (optional)
         """
+        if mode not in ('swap', 'replace', 'upsert'):
+            raise ValueError(f"Unknown mode: {mode}")
+        if mode == 'upsert' and journey_date is None:
+            raise ValueError("journey_date is needed for 'upsert' mode")
+        self.check_local_infile(local_infile)
+        refreshed = False
         self.connect()
-        self.drop_and_create_table(table_name)
-        self.insert_data(table_name, data)
-        self.disconnect()
+        try:  # Pooled connection is given back on errors too
+            self.create_versions_table()
+            if mode == 'upsert':
+                self.ensure_upsert_table(table_name)
+                refreshed_at = self.server_time()
+                rows = keyed_rows(data)
+                if len(rows) < len(data):
+                    print(f"{len(data) - len(rows)} rows without departure time are not upserted.")
+                if self.bulk_load(table_name, rows, chunk_size, journey_date=journey_date,
+                                  refreshed_at=refreshed_at) == len(rows):
+                    scraped_routes = routes if routes is not None else {row[0] for row in data}
+                    self.delete_stale_rows(table_name, journey_date, scraped_routes, refreshed_at)
+                    refreshed = True
+                else:
+                    print("Stale rows are not deleted as some rows failed.")
+            elif mode == 'swap':
+                staging_table = self.prepare_staging_table(table_name)
+                if self.bulk_load(staging_table, data, chunk_size, local_infile, journey_date) == len(data):
+                    self.swap_staging_table(table_name)
+                    refreshed = True
+                else:
+                    print(f"Table '{table_name}' is not replaced as some rows failed, "
+                          f"loaded rows are in '{staging_table}'.")
+            else:
+                self.drop_and_create_table(table_name)
+                self.bulk_load(table_name, data, chunk_size, local_infile, journey_date)
+                refreshed = True
+            if mode != 'swap':  # Swapped table is bumped by swap_staging_table
+                self.bump_generation(table_name)
+        finally:
+            self.disconnect()
+        if dataset and refreshed:  # Dataset has only data published in the table
+            dataset.write(data, journey_date)
+            print(f"{len(data)} rows written to dataset '{dataset.path}'.")
+        elif dataset:
+            print(f"Dataset '{dataset.path}' is not written as table '{table_name}' is not refreshed.")
+
+
+class SQLiteDataHandler(DataHandler):
+    """
+    DataHandler storing data in an embedded SQLite database file, so no database server is needed. Same methods as
+    DataHandler, except LOAD DATA LOCAL INFILE which is not available in SQLite.
+    :param database: Path of the database file, created when not present.
+    """
+    PLACEHOLDER = '?'
+    DatabaseError = sqlite3.Error
+    LOCAL_INFILE = False
+    GENERATION_QUERY = (f"INSERT INTO {VERSIONS_TABLE} (table_name, generation) VALUES (?, 1) "
+                        f"ON CONFLICT (table_name) DO UPDATE SET generation = generation + 1")
+
+    def __init__(self, database):
+        super().__init__(host=None, user=None, password=None, database=database)
+
+    def connect(self):
+        """
+        Open the database file, connection can be used from writer thread of StreamingWriter.
+        :return: boolean True when connected, else False
+        """
+        try:
+            self.connection = sqlite3.connect(self.db_config['database'], check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")  # Readers are not blocked while data is written
+            self.cursor = self.connection.cursor()
+            print("Connected to the database.")
+            return True
+        except sqlite3.Error as error:
+            print(f"Error connecting to database: {error}")
+            return False
+
+    def execute_query(self, query, params=None):
+        """
+        Execute an SQL query and return the result.
+
+        :param query: SQL query to execute, with '?' parameter markers.
+        :param params: Optional query parameters.
+        :return: Result of the query as list of dictionaries if it's a SELECT.
+        """
+        cursor = None
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute(query, self.prepare_values(params))
+            if query.strip().upper().startswith("SELECT"):
+                columns = [column[0] for column in cursor.description]
+                return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            print(f"Error executing query: {e}")
+            self.connection.rollback()
+            raise e
+        finally:
+            if cursor:
+                cursor.close()
+
+    def streaming_cursor(self):
+        """
+        Cursor of the database file, SQLite steps through rows as they are fetched.
+        :return: cursor
+        """
+        return self.connection.cursor()
+
+    def discard_results(self):
+        """SQLite cursors do not hold the connection, nothing to discard."""
+
+    def disconnect(self):
+        """Close the database file."""
+        if self.connection:
+            try:
+                self.cursor.close()
+            finally:
+                self.connection.close()
+                self.connection = None
+                self.cursor = None
+            print("Database connection closed.")
+
+    def drop_and_create_table(self, table_name, with_indexes=True):
+        """
+        Drop the table if it exists and create a new table.
+        :param table_name:  Table Name in database to be Created.
+        :param with_indexes: Boolean flag to create secondary indexes with the table, else they are created later
+         with create_indexes (default: True)
+        """
+        try:
+            self.cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
+            print(f"Table '{table_name}' dropped.")
+            self.cursor.execute(f"""
+                CREATE TABLE {table_name} (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    route TEXT,
+                    url TEXT,
+                    bus_id TEXT,
+                    bus_type TEXT,
+                    departure_time TEXT,
+                    duration TEXT,
+                    arrival_time TEXT,
+                    rating REAL,
+                    price NUMERIC,
+                    seats_available INTEGER,
+                    journey_date TEXT,
+                    is_ac INTEGER,
+                    seat_class TEXT,
+                    duration_minutes INTEGER,
+                    departure_minute INTEGER,
+                    refreshed_at TEXT DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime'))
+                );
+            """)
+            if with_indexes:
+                self.create_indexes(table_name)
+            self.connection.commit()
+            print(f"Table '{table_name}' created.")
+        except sqlite3.Error as error:
+            print(f"Error during table creation: {error}")
+
+    @staticmethod
+    def index_name(table_name, name):
+        """
+        Unique name of a table index. Index names are global in SQLite and kept when a table is renamed, so the
+        creation time is added to keep names of staging, previous and current tables apart.
+        :param table_name: Table Name in database
+        :param name: index name in INDEX_DEFINITIONS
+        :return: index name
+        """
+        return f"{table_name}_{name}_{time.time_ns()}"
+
+    def create_indexes(self, table_name):
+        """
+        Creates secondary indexes of a table created without them.
+        :param table_name: Table Name in database
+        """
+        for name, columns in INDEX_DEFINITIONS.items():
+            self.cursor.execute(f"CREATE INDEX {self.index_name(table_name, name)} ON {table_name} ({columns})")
+        print(f"Indexes of '{table_name}' created.")
+
+    def table_exists(self, table_name):
+        """
+        Checks whether a table is present in the database.
+        :param table_name: Table Name in database
+        :return: boolean True when present, else False
+        """
+        self.cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,))
+        return self.cursor.fetchone()[0] > 0
+
+    def table_columns(self, table_name):
+        """
+        Column names of a table.
+        :param table_name: Table Name in database
+        :return: list of column names
+        """
+        self.cursor.execute(f"PRAGMA table_info({table_name})")
+        return [column[1] for column in self.cursor.fetchall()]
+
+    def server_time(self):
+        """
+        Current time in the format of refreshed_at defaults.
+        :return: datetime
+        """
+        self.cursor.execute("SELECT strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime')")
+        return datetime.strptime(self.cursor.fetchone()[0], "%Y-%m-%d %H:%M:%S.%f")
+
+    def table_version(self, table_name):
+        """
+        Cheap probe of a table's data version, changes whenever the table is written by loader.
+        :param table_name: Table Name in database
+        :return: tuple of version values, to be compared with an earlier version
+        """
+        return (self.table_generation(table_name),)
+
+    def ensure_upsert_table(self, table_name):
+        """
+        Creates the table when not present and adds the refreshed_at column and unique journey key needed for upserts,
+        for tables created by an older version.
+        :param table_name: Table Name in database
+        :raise ValueError: when unique journey key cannot be added, see check_upsert_table
+        """
+        if not self.table_exists(table_name):
+            self.drop_and_create_table(table_name)
+        self.cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?", (table_name,))
+        if not any(UPSERT_KEY_NAME in row[0] for row in self.cursor.fetchall()):
+            self.check_upsert_table(table_name)
+            self.cursor.execute(f"CREATE UNIQUE INDEX {self.index_name(table_name, UPSERT_KEY_NAME)} "
+                                f"ON {table_name} ({', '.join(UPSERT_KEY_COLUMNS)})")
+            print(f"Unique key '{UPSERT_KEY_NAME}' added to '{table_name}'.")
+        if 'refreshed_at' not in self.table_columns(table_name):
+            self.cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN refreshed_at TEXT")
+        self.connection.commit()
+
+    def rename_tables(self, renames):
+        """
+        Renames tables in a single transaction, so readers see all renames at once.
+        :param renames: list of (table name, new table name) tuples, in order
+        """
+        self.connection.commit()
+        try:
+            self.cursor.execute("BEGIN")
+            for table_name, new_name in renames:
+                self.cursor.execute(f"ALTER TABLE {table_name} RENAME TO {new_name}")
+            self.connection.commit()
+        except sqlite3.Error:
+            self.connection.rollback()
+            raise
+
+    def swap_staging_table(self, table_name):
+        """
+        Replaces a table by its loaded staging table in a single transaction, so readers never see an empty or
+        partial table. Replaced table is kept as previous table for rollback.
+        :param table_name: Table Name in database to be replaced.
+        """
+        staging_table = self.staging_table_name(table_name)
+        previous_table = self.previous_table_name(table_name)
+        self.create_indexes(staging_table)
+        self.cursor.execute(f"DROP TABLE IF EXISTS {previous_table}")
+        if self.table_exists(table_name):
+            self.rename_tables([(table_name, previous_table), (staging_table, table_name)])
+        else:
+            self.rename_tables([(staging_table, table_name)])
+        self.bump_generation(table_name)
+        print(f"Table '{table_name}' replaced by '{staging_table}'.")
+
+    def rollback_table(self, table_name):
+        """
+        Swaps a table with its previous table, calling it again restores the replaced data.
+        :param table_name: Table Name in database to be rolled back.
+        """
+        staging_table = self.staging_table_name(table_name)
+        previous_table = self.previous_table_name(table_name)
+        if not self.table_exists(previous_table):
+            print(f"No previous data to restore for '{table_name}'.")
+            return
+        self.create_versions_table()
+        self.cursor.execute(f"DROP TABLE IF EXISTS {staging_table}")
+        self.rename_tables([(table_name, staging_table), (previous_table, table_name), (staging_table, previous_table)])
+        self.bump_generation(table_name)
+        print(f"Table '{table_name}' restored from '{previous_table}'.")
+
+    @staticmethod
+    def prepare_values(values):
+        """
+        Converts query values to types stored by SQLite, dates and times are stored as ISO text.
+        :param values: tuple of values, None for a query without parameters
+        :return: tuple of values
+        """
+        return tuple(value.isoformat(sep=' ') if isinstance(value, datetime)
+                     else value.isoformat() if isinstance(value, date) else value for value in values or ())
+
+    @staticmethod
+    def insert_query(table_name, upsert=False):
+        """
+        Insert query of a scraped data row.
+        :param table_name: Table Name in database to be inserted.
+        :param upsert: Boolean flag to update the existing row of the same journey key (default: False)
+        :return: query text
+        """
+        columns = TABLE_COLUMNS + ['refreshed_at'] if upsert else TABLE_COLUMNS
+        query = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join(['?'] * len(columns))})"
+        if not upsert:
+            return query
+        updates = ', '.join(f"{column} = excluded.{column}" for column in columns if column not in UPSERT_KEY_COLUMNS)
+        return f"{query} ON CONFLICT ({', '.join(UPSERT_KEY_COLUMNS)}) DO UPDATE SET {updates}"
+
+
+def create_data_handler(backend='mysql', host=None, user=None, password=None, database=None, **kwargs):
+    """
+    Creates the DataHandler of a storage backend.
+    :param backend: one of BACKENDS, 'mysql' for a MySQL server or 'sqlite' for an embedded database file
+    :param host: Hostname of the MySQL database, not used by 'sqlite'.
+    :param user: Username for connecting to the MySQL database, not used by 'sqlite'.
+    :param password: Password for connecting to the MySQL database, not used by 'sqlite'.
+    :param database: Name of the MySQL database, or path of the SQLite database file.
+    :param kwargs: Other arguments of DataHandler
+    :return: DataHandler instance
+    """
+    if backend == 'mysql':
+        return DataHandler(host, user, password, database, **kwargs)
+    if backend == 'sqlite':
+        return SQLiteDataHandler(database)
+    raise ValueError(f"Unknown backend: {backend}")
+
+
+class StreamingWriter:
+    """
+    Writes scraped data to a database table from a background thread while scraping continues. Scraped data of
+    every route is put on a bounded queue, and inserted in batches so data is queryable before scraping finishes.
+    When writer thread stops on an error, put and close raise RuntimeError instead of waiting for it.
+    :param data_handler: DataHandler with credentials of the database, its connection is used by writer thread.
+    :param table_name: Table Name in database to be added.
+    :param batch_size: Count of rows inserted in a single batch (default: 500).
+    :param max_pending: Count of route data waiting in queue, put blocks when queue is full (default: 100).
+    :param flush_interval: Seconds after which a partial batch is inserted when no data arrives, generation of the
+     table is bumped at most once in this interval while rows are written (default: 5).
+    :param mode: 'replace' to drop and create the table when writer starts, so rows are queryable while scraping,
+     'swap' to write into a staging table that replaces the table atomically when writer is closed, 'upsert' to
+     update only the written routes of the journey date, deleting their rows not written when writer is closed
+     (default: 'replace')
+    :param journey_date: Date of the scraped data, date or text in '%d-%b-%Y' format, needed for 'upsert' and
+     history.
+    :param history: HistoryStore where written data is also added as a snapshot, to keep price history. Its
+     retention is applied when writer is closed (optional)
+    :param dataset: ParquetDataset where written data is also added, needs journey_date. Written rows are kept in
+     memory and written once when writer is closed, only when the table is refreshed, so every route gets a single
+     file and the dataset never has rows the table does not (optional)
+    """
+    _STOP = object()
+
+    def __init__(self, data_handler, table_name, batch_size=500, max_pending=100, flush_interval=5,
+                 mode='replace', journey_date=None, history=None, dataset=None):
+        if mode not in ('swap', 'replace', 'upsert'):
+            raise ValueError(f"Unknown mode: {mode}")
+        if (mode == 'upsert' or history or dataset) and journey_date is None:
+            raise ValueError("journey_date is needed for 'upsert' mode, history and dataset")
+        self.data_handler = data_handler
+        self.table_name = table_name
+        self.mode = mode
+        self.journey_date = journey_date
+        self.target_table = table_name
+        self.refreshed_at = None
+        self.history = history
+        self.dataset = dataset
+        self.scraped_at = None
+        self.routes = set()
+        self.dataset_rows = []
+        self.failed_rows = 0
+        self.skipped_rows = 0
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.row_count = 0
+        self.error = None
+        self._bumped_at = 0
+        self._bump_pending = False
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(exc_type)
+
+    def start(self):
+        """
+        Connects to database, creates the table and starts writer thread. Connection is given back when preparing
+        the table fails, as __exit__ is not called then.
+        """
+        self.data_handler.connect()
+        try:
+            self.data_handler.create_versions_table()
+            if self.mode == 'swap':
+                self.target_table = self.data_handler.prepare_staging_table(self.table_name)
+            elif self.mode == 'upsert':
+                self.data_handler.ensure_upsert_table(self.table_name)
+                self.refreshed_at = self.data_handler.server_time()
+            else:
+                self.data_handler.drop_and_create_table(self.table_name)
+                self.data_handler.bump_generation(self.table_name)
+            if self.history:
+                self.history.create_tables()
+                self.scraped_at = datetime.now()
+        except BaseException:
+            self.data_handler.disconnect()
+            raise
+        self.thread.start()
+        return self
+
+    def _put(self, item):
+        """
+        Adds an item to queue, waiting while queue is full only as long as writer thread is running.
+        :param item: Scraped data or _STOP
+        :return: boolean True when added, False when writer thread is not running
+        """
+        while self.thread.is_alive():
+            try:
+                self.queue.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def writer_error(self):
+        """Error to raise when writer thread is not running"""
+        if self.error is not None:
+            return RuntimeError(f"Writer of '{self.table_name}' stopped on error: {self.error!r}")
+        return RuntimeError(f"Writer of '{self.table_name}' is not running")
+
+    def put(self, data, route=None):
+        """
+        Adds scraped data to be written, blocks while queue is full.
+        :param data: Scraped data of a route.
+        :param route: Route Name of the scraped data. In 'upsert' mode its rows not written are deleted when writer
+         is closed, also when data is empty as for a route that has no buses now. Only routes of written rows are
+         known when not given.
+        :raise RuntimeError: when writer thread is not running
+        """
+        if (data or route is not None) and not self._put((route, data)):
+            raise self.writer_error() from self.error
+
+    def _flush(self, batch):
+        """Inserts a batch of rows"""
+        if self.mode == 'upsert':
+            rows = keyed_rows(batch)
+            self.skipped_rows += len(batch) - len(rows)
+            batch = rows
+        if batch and self.data_handler.insert_data(self.target_table, batch, self.journey_date, self.refreshed_at):
+            self.row_count += len(batch)
+            self.routes.update(row[0] for row in batch)
+            if self.mode != 'swap':  # Rows are visible in table while scraping
+                self._bump_pending = True
+                self._bump_generation()
+            if self.history:
+                try:
+                    self.history.record(batch, self.journey_date, self.scraped_at)
+                except self.data_handler.DatabaseError as error:
+                    print(f"Error adding rows to history: {error}")
+            if self.dataset:
+                self.dataset_rows += batch
+        elif batch:
+            self.failed_rows += len(batch)
+
+    def _bump_generation(self, force=False):
+        """
+        Bumps generation of the table for rows written since last bump, at most once in flush_interval.
+        :param force: Boolean flag to bump without waiting for the interval (default: False)
+        """
+        if self._bump_pending and (force or time.monotonic() - self._bumped_at >= self.flush_interval):
+            self.data_handler.bump_generation(self.table_name)
+            self._bumped_at = time.monotonic()
+            self._bump_pending = False
+
+    def _run(self):
+        """
+        Drains the queue into the table in batches until close is called. An error stops the thread and is kept in
+        error, so put and close do not wait for it.
+        """
+        batch = []
+        try:
+            while True:
+                try:
+                    data = self.queue.get(timeout=self.flush_interval)
+                except queue.Empty:  # Scraping is slower than writing, inserting what is available
+                    self._flush(batch)
+                    self._bump_generation()
+                    batch = []
+                    continue
+                if data is self._STOP:
+                    break
+                route, data = data
+                if route is not None:
+                    self.routes.add(route)
+                batch += data
+                while len(batch) >= self.batch_size:
+                    self._flush(batch[:self.batch_size])
+                    batch = batch[self.batch_size:]
+            self._flush(batch)
+            self._bump_generation(force=True)
+        except Exception as error:
+            self.error = error
+            print(f"Error writing to '{self.target_table}', writer stopped: {error!r}")
+
+    def close(self, exc_type=None):
+        """
+        Writes remaining data, waits for writer thread and disconnects. Table is swapped and stale rows are deleted
+        only when scraping completed and all rows were written, else loaded rows are left in place. Dataset is
+        written after the table is refreshed.
+        :param exc_type: Type of the exception that stopped scraping, None when scraping completed
+        :raise RuntimeError: when writer thread stopped on an error
+        """
+        if self._put(self._STOP):
+            self.thread.join()
+        refreshed = False
+        try:
+            if self.error is not None or exc_type is not None:
+                reason = "writer stopped" if self.error is not None else f"scraping failed with {exc_type.__name__}"
+                print(f"Table '{self.table_name}' is not refreshed as {reason}, "
+                      f"loaded rows are in '{self.target_table}'.")
+            elif self.failed_rows and self.mode != 'replace':
+                print(f"Table '{self.table_name}' is not refreshed as {self.failed_rows} rows failed, "
+                      f"loaded rows are in '{self.target_table}'.")
+            else:
+                if self.mode == 'swap':
+                    self.data_handler.swap_staging_table(self.table_name)
+                elif self.mode == 'upsert':
+                    self.data_handler.delete_stale_rows(self.table_name, self.journey_date, self.routes,
+                                                        self.refreshed_at)
+                    self.data_handler.bump_generation(self.table_name)
+                refreshed = True
+            if self.history and self.error is None:
+                try:
+                    self.history.apply_retention()
+                except self.data_handler.DatabaseError as error:
+                    print(f"Error dropping old history partitions: {error}")
+        finally:
+            self.data_handler.disconnect()
+        print(f"{self.row_count} rows written to '{self.table_name}'.")
+        if self.dataset and refreshed:
+            try:
+                self.dataset.write(self.dataset_rows, self.journey_date)
+                print(f"{len(self.dataset_rows)} rows written to dataset '{self.dataset.path}'.")
+            except (OSError, ValueError) as error:
+                print(f"Error writing rows to dataset: {error}")
+        elif self.dataset:
+            print(f"Dataset '{self.dataset.path}' is not written as table '{self.table_name}' is not refreshed.")
+        if self.skipped_rows:
+            print(f"{self.skipped_rows} rows without departure time are not upserted.")
+        if self.error is not None:
+            raise self.writer_error() from self.error
 
 
 if __name__ == "__main__":
@@ -127,7 +1242,7 @@ if __name__ == "__main__":
         database='Your database name',  # Give your database name
     )
 
-    # db_manager.add_scraped_data_to_database('your_table', data=your_data)
+    # db_manager.add_scraped_data_to_database('your_table', data=your_data, journey_date='17-Oct-2024')
 
     # You can add data to your database with this custom method having similar column in your table
 
@@ -140,4 +1255,5 @@ if __name__ == "__main__":
     #                     arrival_time TIME,
     #                     rating FLOAT,
     #                     price DECIMAL(10, 2),
-    #                     seats_available INT
\ No newline at end of file
+    #                     seats_available INT
+    # journey_date, is_ac, seat_class, duration_minutes and departure_minute are derived from these columns
\ No newline at end of file
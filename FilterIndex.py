@@ -0,0 +1,225 @@
+import time
+import numpy as np
+import pandas as pd
+from BusFeatures import SEAT_CLASSES, seat_classes_for
+from FilterQuery import time_range_minutes
+
+# Minutes of a departure time bucket, Select Time Range options are whole buckets
+TIME_BUCKET_MINUTES = 360
+TIME_BUCKET_COUNT = 24 * 60 // TIME_BUCKET_MINUTES
+# Columns kept sorted for range filters and sorting
+RANKED_COLUMNS = ['rating', 'price', 'duration_minutes']
+
+
+def packed_bitmap(mask):
+    """
+    Packs a boolean row mask into a bitmap of one bit per row.
+    :param mask: boolean numpy array
+    :return: uint8 numpy array
+    """
+    return np.packbits(mask)
+
+
+def rank_column(values):
+    """
+    Sorts a numeric column for binary search range cuts.
+    :param values: float numpy array, NaN for missing values
+    :return: tuple of sorted values with NaN last, rank of every row in sorted values and count of rows with value,
+     rows without value have the highest ranks
+    """
+    order = np.argsort(values, kind='stable')
+    ranks = np.empty(len(values), dtype=np.int32)
+    ranks[order] = np.arange(len(values), dtype=np.int32)
+    return values[order], ranks, np.count_nonzero(~np.isnan(values))
+
+
+class FilterIndex:
+    """
+    In-memory index of loaded bus data answering Select Bus filters without scanning columns.
+
+    Rows are ordered by route, so a route is a contiguous range of rows, the run length form of its bitmap. Seat
+    class, AC type and departure time bucket have a packed bitmap per value, filters are intersected with bitwise AND
+    of bitmap bytes in route range, 8 rows per byte. Rating and price are kept sorted, a range filter is a binary
+    search giving a rank cut, and candidate rows are kept by comparing their rank with it. Duration is ranked the same.
+    :param df: DataFrame of bus data with route, seat_class, is_ac, departure_minute, rating, price and
+     duration_minutes, as loaded by BusApp
+    """
+    def __init__(self, df):
+        self.df = df.sort_values(["route", "departure_minute"], kind='stable').reset_index(drop=True)
+        self.row_count = len(self.df)
+
+        codes, routes = pd.factorize(self.df["route"])
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if self.row_count else np.array([], int)
+        ends = np.r_[starts[1:], self.row_count]
+        self.route_ranges = {routes[codes[start]]: (start, end) for start, end in zip(starts, ends)
+                             if codes[start] >= 0}
+
+        seat_class = self.df["seat_class"].astype(str).to_numpy()
+        self.seat_class_bitmaps = {value: packed_bitmap(seat_class == value) for value in SEAT_CLASSES}
+        is_ac = self.df["is_ac"].astype("boolean")
+        self.ac_bitmaps = {value: packed_bitmap(is_ac.eq(value).fillna(False).to_numpy(dtype=bool))
+                           for value in (True, False)}
+        self.departure_minutes = pd.to_numeric(self.df["departure_minute"]).to_numpy(dtype=float, na_value=np.nan)
+        buckets = self.departure_minutes // TIME_BUCKET_MINUTES
+        self.bucket_bitmaps = [packed_bitmap(buckets == bucket) for bucket in range(TIME_BUCKET_COUNT)]
+
+        self.ranked = {column: rank_column(pd.to_numeric(self.df[column]).to_numpy(dtype=float, na_value=np.nan))
+                       for column in RANKED_COLUMNS}
+
+    def range_cut(self, rows, column, lowest=None, highest=None):
+        """
+        Keeps rows whose value of a ranked column is in a range, rows without value are dropped.
+        :param rows: row positions
+        :param column: one of RANKED_COLUMNS
+        :param lowest: Minimum value, included
+        :param highest: Maximum value, included
+        :return: row positions
+        """
+        sorted_values, ranks, valued_count = self.ranked[column]
+        first = np.searchsorted(sorted_values, lowest, side='left') if lowest is not None else 0
+        last = np.searchsorted(sorted_values, highest, side='right') if highest is not None else valued_count
+        row_ranks = ranks[rows]
+        return rows[(row_ranks >= first) & (row_ranks < min(last, valued_count))]
+
+    @staticmethod
+    def union(bitmaps, byte_start, byte_end):
+        """Bitwise OR of bitmap bytes in a range"""
+        result = bitmaps[0][byte_start:byte_end].copy()
+        for bitmap in bitmaps[1:]:
+            result |= bitmap[byte_start:byte_end]
+        return result
+
+    def time_buckets(self, time_range):
+        """
+        Buckets covering a time range.
+        :param time_range: time range text as '18:00-00:00'
+        :return: tuple of bucket numbers and whether the range is exactly these buckets
+        """
+        start_minute, end_minute = time_range_minutes(time_range)
+        first = start_minute // TIME_BUCKET_MINUTES
+        last = -(-end_minute // TIME_BUCKET_MINUTES) or TIME_BUCKET_COUNT  # Range ending at midnight
+        buckets = range(first, last) if first < last else [*range(first, TIME_BUCKET_COUNT), *range(last)]
+        exact = start_minute % TIME_BUCKET_MINUTES == 0 and end_minute % TIME_BUCKET_MINUTES == 0
+        return list(buckets), exact
+
+    def query_rows(self, filters):
+        """
+        Finds positions of rows matching Select Bus filters.
+        :param filters: dictionary of route, seat_type, ac_type, min_rating, time_range, max_fare and max_duration
+         (hours) filter values, as kept in st.session_state, 'All' or missing for no filter
+        :return: numpy array of row positions in df, ordered by route and departure
+        """
+        start, end = 0, self.row_count
+        if filters.get('route', 'All') != 'All':
+            start, end = self.route_ranges.get(filters['route'], (0, 0))
+        byte_start, byte_end = start // 8, -(-end // 8)
+
+        bitmaps = []
+        if filters.get('seat_type', 'All') != 'All':
+            bitmaps.append(self.union([self.seat_class_bitmaps[value]
+                                       for value in seat_classes_for(filters['seat_type'])], byte_start, byte_end))
+        if filters.get('ac_type', 'All') != 'All':
+            bitmaps.append(self.ac_bitmaps[filters['ac_type'] == 'AC'][byte_start:byte_end])
+        exact_time = True
+        if filters.get('time_range', 'All') != 'All':
+            buckets, exact_time = self.time_buckets(filters['time_range'])
+            bitmaps.append(self.union([self.bucket_bitmaps[bucket] for bucket in buckets], byte_start, byte_end))
+
+        if bitmaps:
+            bits = bitmaps[0].copy() if len(bitmaps) == 1 else np.bitwise_and.reduce(bitmaps)
+            mask = np.unpackbits(bits)[start - byte_start * 8:end - byte_start * 8].view(bool)
+            rows = np.flatnonzero(mask) + start
+        else:
+            rows = np.arange(start, end)
+
+        if not exact_time:
+            start_minute, end_minute = time_range_minutes(filters['time_range'])
+            minutes = self.departure_minutes[rows]
+            if start_minute < end_minute:
+                rows = rows[(minutes >= start_minute) & (minutes < end_minute)]
+            else:
+                rows = rows[(minutes >= start_minute) | (minutes < end_minute)]
+        if filters.get('min_rating') is not None:
+            rows = self.range_cut(rows, 'rating', lowest=filters['min_rating'])
+        if filters.get('max_fare') is not None:
+            rows = self.range_cut(rows, 'price', highest=filters['max_fare'])
+        if filters.get('max_duration') is not None:
+            rows = self.range_cut(rows, 'duration_minutes', highest=filters['max_duration'] * 60)
+        return rows
+
+    def query(self, filters):
+        """
+        Finds rows matching Select Bus filters.
+        :param filters: filter values, same as query_rows
+        :return: DataFrame of matching rows
+        """
+        return self.df.take(self.query_rows(filters))
+
+    def sort_rows(self, rows, sort_by, descending=False):
+        """
+        Orders matching rows by a column, using the ranks kept for range filters, rows without value are last.
+        :param rows: row positions from query_rows
+        :param sort_by: 'departure_minute' or one of RANKED_COLUMNS
+        :param descending: Boolean flag to order by descending values (default: False)
+        :return: numpy array of row positions
+        """
+        if sort_by == 'departure_minute':
+            values = self.departure_minutes[rows]
+        elif sort_by in self.ranked:
+            _, ranks, valued_count = self.ranked[sort_by]
+            values = ranks[rows].astype(float)
+            values[values >= valued_count] = np.nan
+        else:
+            raise ValueError(f"Cannot order by: {sort_by}")
+        missing = np.isnan(values)
+        return rows[np.lexsort((-values if descending else values, missing))]
+
+    def page(self, rows, offset, limit):
+        """
+        Takes a page of rows, only these rows are materialized.
+        :param rows: row positions from query_rows or sort_rows
+        :param offset: Count of rows to skip
+        :param limit: Count of rows in page
+        :return: DataFrame of page rows
+        """
+        return self.df.take(rows[offset:offset + limit])
+
+
+if __name__ == "__main__":
+    # Benchmark of index query against filtering with pandas masks, on generated data
+    row_count = 3_000_000
+    generator = np.random.default_rng(7)
+    data = pd.DataFrame({
+        'route': pd.Series(generator.integers(0, 300, row_count)).map(lambda number: f"Route {number}"),
+        'seat_class': pd.Categorical(generator.choice(SEAT_CLASSES, row_count), categories=SEAT_CLASSES),
+        'is_ac': pd.Series(generator.choice([True, False], row_count), dtype="boolean"),
+        'departure_minute': generator.integers(0, 24 * 60, row_count),
+        'rating': np.round(generator.uniform(1, 5, row_count), 1),
+        'price': np.round(generator.uniform(200, 3000, row_count), 2),
+        'duration_minutes': generator.integers(60, 20 * 60, row_count),
+    })
+    filters = {'route': 'Route 7', 'seat_type': 'Sleeper', 'ac_type': 'AC', 'min_rating': 3.5,
+               'time_range': '18:00-00:00', 'max_fare': 1500, 'max_duration': 12}
+
+    def filter_with_masks():
+        df = data[data["route"] == filters['route']]
+        df = df[df["seat_class"].isin(seat_classes_for(filters['seat_type']))]
+        df = df[df["is_ac"].eq(True).fillna(False)]
+        df = df[df["rating"] >= filters['min_rating']]
+        df = df[(df["departure_minute"] >= 18 * 60) | (df["departure_minute"] < 0)]
+        df = df[df["price"] <= filters['max_fare']]
+        return df[df["duration_minutes"] <= filters['max_duration'] * 60]
+
+    def timed(function, runs=20):
+        started = time.perf_counter()
+        for _ in range(runs):
+            result = function()
+        return (time.perf_counter() - started) / runs * 1000, len(result)
+
+    started = time.perf_counter()
+    index = FilterIndex(data)
+    print(f"Index of {row_count} rows built in {time.perf_counter() - started:.2f} s")
+    print("Pandas masks: {:.3f} ms, {} rows".format(*timed(filter_with_masks)))
+    print("Filter index: {:.3f} ms, {} rows".format(*timed(lambda: index.query(filters))))
+    print("Filter index, no route: {:.3f} ms, {} rows".format(
+        *timed(lambda: index.query({**filters, 'route': 'All'}))))
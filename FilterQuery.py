@@ -0,0 +1,108 @@
+from BusFeatures import seat_classes_for, time_to_minutes
+
+# Maximum count of rows returned by a filter query
+RESULT_LIMIT = 1000
+# Columns results can be ordered by
+ORDER_COLUMNS = ['departure_minute', 'price', 'rating', 'duration_minutes', 'seats_available']
+# Primary key of tables created by DataHandler, last ordering column so rows of equal values keep the same order
+# in every page
+ORDER_KEY = 'id'
+
+
+def time_range_minutes(time_range):
+    """
+    Converts a time range filter as '18:00-00:00' to minutes since midnight.
+    :param time_range: time range text
+    :return: tuple of start and end minutes
+    """
+    start_time, end_time = time_range.split("-")
+    return time_to_minutes(start_time), time_to_minutes(end_time)
+
+
+def filter_conditions(filters, placeholder='%s'):
+    """
+    Builds WHERE clause of Select Bus filters on the derived columns.
+    :param filters: dictionary of route, seat_type, ac_type, min_rating, time_range, max_fare and max_duration
+     (hours) filter values, as kept in st.session_state, 'All' or missing for no filter
+    :param placeholder: Parameter marker of the database driver, PLACEHOLDER of DataHandler (default: '%s')
+    :return: tuple of WHERE clause text, empty without filters, and parameters
+    """
+    conditions = []
+    params = []
+
+    def add(condition, *values):
+        conditions.append(condition.replace('?', placeholder))
+        params.extend(values)
+
+    if filters.get('route', 'All') != 'All':
+        add("route = ?", filters['route'])
+
+    if filters.get('seat_type', 'All') != 'All':
+        seat_classes = seat_classes_for(filters['seat_type'])
+        add(f"seat_class IN ({', '.join(['?'] * len(seat_classes))})", *seat_classes)
+
+    if filters.get('ac_type', 'All') != 'All':
+        add("is_ac = ?", 1 if filters['ac_type'] == 'AC' else 0)
+
+    if filters.get('min_rating') is not None:
+        add("rating >= ?", filters['min_rating'])
+
+    if filters.get('time_range', 'All') != 'All':
+        start_minute, end_minute = time_range_minutes(filters['time_range'])
+        if start_minute < end_minute:
+            add("departure_minute >= ? AND departure_minute < ?", start_minute, end_minute)
+        else:  # Range passing midnight
+            add("(departure_minute >= ? OR departure_minute < ?)", start_minute, end_minute)
+
+    if filters.get('max_fare') is not None:
+        add("price <= ?", filters['max_fare'])
+
+    if filters.get('max_duration') is not None:
+        add("duration_minutes <= ?", filters['max_duration'] * 60)
+
+    return (" WHERE " + " AND ".join(conditions)) if conditions else "", params
+
+
+def build_filter_query(table_name, filters, placeholder='%s', order_by=('departure_minute', 'price'),
+                       limit=RESULT_LIMIT, offset=0, descending=False):
+    """
+    Builds a parameterized SELECT returning only buses matching Select Bus filters, so filtering runs in database
+    using the derived columns and their indexes.
+    :param table_name: Table Name in database, loaded by DataHandler with derived columns
+    :param filters: dictionary of route, seat_type, ac_type, min_rating, time_range, max_fare and max_duration
+     (hours) filter values, as kept in st.session_state, 'All' or missing for no filter
+    :param placeholder: Parameter marker of the database driver, PLACEHOLDER of DataHandler (default: '%s')
+    :param order_by: Columns of ORDER_COLUMNS results are ordered by, rows without value last, same as
+     FilterIndex.sort_rows, then by ORDER_KEY (default: departure and price)
+    :param limit: Maximum count of rows returned, all when None (default: RESULT_LIMIT)
+    :param offset: Count of matching rows to skip, for pages after the first (default: 0)
+    :param descending: Boolean flag to order by descending values (default: False)
+    :return: tuple of query text and parameters
+    """
+    unknown = set(order_by) - set(ORDER_COLUMNS)
+    if unknown:
+        raise ValueError(f"Cannot order by: {', '.join(sorted(unknown))}")
+
+    where, params = filter_conditions(filters, placeholder)
+    query = f"SELECT * FROM {table_name}{where}"
+    if order_by:
+        direction = " DESC" if descending else ""
+        query += " ORDER BY " + ", ".join(f"{column} IS NULL, {column}{direction}" for column in order_by)
+        query += f", {ORDER_KEY}"
+    if limit is not None:
+        query += f" LIMIT {int(limit)}"
+        if offset:
+            query += f" OFFSET {int(offset)}"
+    return query, tuple(params)
+
+
+def build_count_query(table_name, filters, placeholder='%s'):
+    """
+    Builds a parameterized query counting buses matching Select Bus filters, for pagination.
+    :param table_name: Table Name in database, loaded by DataHandler with derived columns
+    :param filters: filter values, same as build_filter_query
+    :param placeholder: Parameter marker of the database driver, PLACEHOLDER of DataHandler (default: '%s')
+    :return: tuple of query text and parameters
+    """
+    where, params = filter_conditions(filters, placeholder)
+    return f"SELECT COUNT(*) AS bus_count FROM {table_name}{where}", tuple(params)
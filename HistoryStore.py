@@ -0,0 +1,250 @@
+from datetime import date, datetime, timedelta
+from BusFeatures import parse_journey_date, time_to_minutes
+from DataHandler import DATA_COLUMNS
+
+# Partition holding journey dates beyond the last daily partition
+FUTURE_PARTITION = 'p_future'
+# Columns identifying a bus of a route on a journey date, leading columns of the history primary key
+BUS_KEY_COLUMNS = ['journey_date', 'route_id', 'bus_id', 'bus_type', 'departure_minute']
+# Index of route dictionary for queries by Route Name, its unique key leads with url
+ROUTE_INDEX_NAME = 'idx_route_name'
+# Days of journey dates kept before today by the Streamlit app
+HISTORY_RETENTION_DAYS = 90
+
+
+def partition_name(journey_date):
+    """
+    Name of the daily partition of a journey date.
+    :param journey_date: date of the partition
+    :return: partition name as 'p20241017'
+    """
+    return f"p{journey_date:%Y%m%d}"
+
+
+def partition_date(name):
+    """
+    Journey date of a daily partition.
+    :param name: partition name
+    :return: date, None for FUTURE_PARTITION
+    """
+    if name == FUTURE_PARTITION:
+        return None
+    return datetime.strptime(name[1:], "%Y%m%d").date()
+
+
+class HistoryStore:
+    """
+    Append-only history of price and seat availability of every bus, each scrape is added as a snapshot with its
+    scrape time so changes can be followed as departure approaches. History table is range partitioned by journey
+    date with a partition per day, queries of a date only read its partition and old dates are removed by dropping
+    partitions. Route name and link are stored once in a route dictionary table and referred by id.
+
+    History primary key is (journey_date, route_id, bus_id, bus_type, departure_minute, scraped_at), so snapshots
+    of a bus are stored together and latest snapshot is read from the index. idx_route_trend covers price trend of
+    a route over journey dates.
+
+    Connection of data_handler is used, it has to be connected before calling methods.
+    :param data_handler: DataHandler of the database
+    :param table_name: Bus data table name, history is stored in '<table>_history' and '<table>_history_routes'.
+    :param retention_days: Days of journey dates kept before today, older partitions are dropped by apply_retention
+     when StreamingWriter is closed. All history is kept when not given.
+    """
+    def __init__(self, data_handler, table_name, retention_days=None):
+        self.data_handler = data_handler
+        self.history_table = f"{table_name}_history"
+        self.routes_table = f"{table_name}_history_routes"
+        self.retention_days = retention_days
+        self._route_ids = {}
+        self._partition_dates = set()
+
+    @property
+    def cursor(self):
+        return self.data_handler.cursor
+
+    def create_tables(self):
+        """Creates history and route dictionary tables when not present, and route index of older tables."""
+        self.cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.routes_table} (
+                route_id INT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+                route VARCHAR(100) NOT NULL,
+                url VARCHAR(255) NOT NULL,
+                UNIQUE KEY uk_route (url, route),
+                INDEX {ROUTE_INDEX_NAME} (route)
+            );
+        """)
+        self.cursor.execute("SELECT COUNT(*) FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE() "
+                            "AND TABLE_NAME = %s AND INDEX_NAME = %s", (self.routes_table, ROUTE_INDEX_NAME))
+        if self.cursor.fetchone()[0] == 0:
+            self.cursor.execute(f"ALTER TABLE {self.routes_table} ADD INDEX {ROUTE_INDEX_NAME} (route)")
+        self.cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.history_table} (
+                journey_date DATE NOT NULL,
+                route_id INT UNSIGNED NOT NULL,
+                bus_id VARCHAR(255) NOT NULL,
+                bus_type VARCHAR(50) NOT NULL,
+                departure_minute SMALLINT NOT NULL,
+                scraped_at DATETIME NOT NULL,
+                price DECIMAL(10, 2),
+                seats_available SMALLINT,
+                PRIMARY KEY ({', '.join(BUS_KEY_COLUMNS)}, scraped_at),
+                INDEX idx_route_trend (route_id, journey_date, scraped_at, price, seats_available)
+            )
+            PARTITION BY RANGE (TO_DAYS(journey_date)) (
+                PARTITION {FUTURE_PARTITION} VALUES LESS THAN MAXVALUE
+            );
+        """)
+        self.data_handler.connection.commit()
+
+    def partitions(self):
+        """
+        Daily partitions of history table.
+        :return: dictionary of journey date to partition name, sorted by date
+        """
+        self.cursor.execute("SELECT PARTITION_NAME FROM information_schema.PARTITIONS WHERE TABLE_SCHEMA = DATABASE() "
+                            "AND TABLE_NAME = %s", (self.history_table,))
+        names = [row[0] for row in self.cursor.fetchall() if row[0] and row[0] != FUTURE_PARTITION]
+        return {partition_date(name): name for name in sorted(names)}
+
+    def ensure_partition(self, journey_date):
+        """
+        Adds the daily partition of a journey date, by splitting the partition whose range holds the date.
+        Partitions are read only for a date not seen before by this instance.
+        :param journey_date: date, or text in '%d-%b-%Y' format
+        """
+        journey_date = parse_journey_date(journey_date)
+        if journey_date in self._partition_dates:
+            return
+        partitions = self.partitions()
+        if journey_date in partitions:
+            self._partition_dates.add(journey_date)
+            return
+        holder = next((name for day, name in partitions.items() if day > journey_date), FUTURE_PARTITION)
+        holder_bound = ("MAXVALUE" if holder == FUTURE_PARTITION
+                        else f"(TO_DAYS('{partition_date(holder) + timedelta(days=1)}'))")
+        self.cursor.execute(f"""
+            ALTER TABLE {self.history_table} REORGANIZE PARTITION {holder} INTO (
+                PARTITION {partition_name(journey_date)}
+                    VALUES LESS THAN (TO_DAYS('{journey_date + timedelta(days=1)}')),
+                PARTITION {holder} VALUES LESS THAN {holder_bound}
+            )
+        """)
+        self._partition_dates.add(journey_date)
+        print(f"Partition '{partition_name(journey_date)}' added to '{self.history_table}'.")
+
+    def drop_partitions_before(self, journey_date):
+        """
+        Removes history of journey dates before a date by dropping their partitions, without deleting rows.
+        :param journey_date: date, or text in '%d-%b-%Y' format, first journey date to keep
+        :return: names of dropped partitions
+        """
+        journey_date = parse_journey_date(journey_date)
+        # A partition also holds earlier dates that had no own partition when added, all are before its date
+        names = [name for day, name in self.partitions().items() if day < journey_date]
+        if names:
+            self.cursor.execute(f"ALTER TABLE {self.history_table} DROP PARTITION {', '.join(names)}")
+            print(f"Partitions {', '.join(names)} dropped from '{self.history_table}'.")
+        self._partition_dates = {day for day in self._partition_dates if day >= journey_date}
+        return names
+
+    def apply_retention(self, today=None):
+        """
+        Drops partitions of journey dates more than retention_days before today.
+        :param today: date retention is counted from (default: current date)
+        :return: names of dropped partitions, empty when retention_days is not given
+        """
+        if self.retention_days is None:
+            return []
+        return self.drop_partitions_before((today or date.today()) - timedelta(days=self.retention_days))
+
+    def route_ids(self, routes):
+        """
+        Ids of routes in route dictionary, adding routes not present.
+        :param routes: set of (route name, route link) tuples, without None as columns are NOT NULL
+        :return: dictionary of (route name, route link) to route id
+        """
+        missing = [route for route in routes if route not in self._route_ids]
+        if missing:
+            self.cursor.executemany(f"INSERT IGNORE INTO {self.routes_table} (route, url) VALUES (%s, %s)", missing)
+            self.data_handler.connection.commit()
+            self.cursor.execute(f"SELECT route, url, route_id FROM {self.routes_table}")
+            self._route_ids = {(route, url): route_id for route, url, route_id in self.cursor.fetchall()}
+        return self._route_ids
+
+    def record(self, data, journey_date, scraped_at=None):
+        """
+        Adds scraped data as a snapshot. Rows without a departure time cannot be identified and are skipped.
+        :param data: scraped data
+        :param journey_date: Date of the scraped data, date or text in '%d-%b-%Y' format
+        :param scraped_at: Time of the scrape, same for all data of a scrape (default: now)
+        :return: count of rows added
+        """
+        journey_date = parse_journey_date(journey_date)
+        scraped_at = (scraped_at or datetime.now()).replace(microsecond=0)
+        route, url, bus_id, bus_type, departure, price, seats = (
+            DATA_COLUMNS.index(column) for column in ['route', 'url', 'bus_id', 'bus_type', 'departure_time', 'price',
+                                                      'seats_available'])
+        # Missing route name or link is stored as empty text, same as bus_id and bus_type
+        route_ids = self.route_ids({(row[route] or '', row[url] or '') for row in data})
+        rows = []
+        for row in data:
+            departure_minute = time_to_minutes(row[departure])
+            if departure_minute is not None:
+                rows.append((journey_date, route_ids[(row[route] or '', row[url] or '')], row[bus_id] or '',
+                             row[bus_type] or '', departure_minute, scraped_at, row[price], row[seats]))
+        if not rows:
+            return 0
+        self.ensure_partition(journey_date)
+        self.cursor.executemany(f"""
+            INSERT INTO {self.history_table} ({', '.join(BUS_KEY_COLUMNS)}, scraped_at, price, seats_available)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE price = VALUES(price), seats_available = VALUES(seats_available)
+        """, rows)
+        self.data_handler.connection.commit()
+        return len(rows)
+
+    def latest_snapshot(self, journey_date, route=None):
+        """
+        Latest price and seat availability of every bus of a journey date. Latest scrape time of each bus is read
+        from the primary key of the date partition only.
+        :param journey_date: date, or text in '%d-%b-%Y' format
+        :param route: Only buses of this Route Name when given
+        :return: list of dictionaries of route, url, bus_id, bus_type, departure_minute, price, seats_available and
+         scraped_at
+        """
+        route_filter = f"AND route_id IN (SELECT route_id FROM {self.routes_table} WHERE route = %s)" if route else ""
+        params = (parse_journey_date(journey_date),) + ((route,) if route else ())
+        return self.data_handler.execute_query(f"""
+            SELECT r.route, r.url, h.bus_id, h.bus_type, h.departure_minute, h.price, h.seats_available, h.scraped_at
+            FROM (
+                SELECT {', '.join(BUS_KEY_COLUMNS)}, MAX(scraped_at) AS scraped_at
+                FROM {self.history_table}
+                WHERE journey_date = %s {route_filter}
+                GROUP BY {', '.join(BUS_KEY_COLUMNS)}
+            ) latest
+            JOIN {self.history_table} h USING ({', '.join(BUS_KEY_COLUMNS)}, scraped_at)
+            JOIN {self.routes_table} r ON r.route_id = h.route_id
+            ORDER BY r.route, h.departure_minute
+        """, params)
+
+    def price_trend(self, route, start_date, end_date=None):
+        """
+        Price and seat availability of a route at every scrape, for journey dates in a range. Only partitions of the
+        range are read, using idx_route_trend as covering index.
+        :param route: Route Name
+        :param start_date: First journey date, date or text in '%d-%b-%Y' format
+        :param end_date: Last journey date, same as start_date when not given
+        :return: list of dictionaries of journey_date, scraped_at, days_to_departure, min_price, avg_price,
+         seats_available and bus_count, ordered by journey date and scrape time
+        """
+        start_date = parse_journey_date(start_date)
+        end_date = parse_journey_date(end_date) or start_date
+        return self.data_handler.execute_query(f"""
+            SELECT journey_date, scraped_at, DATEDIFF(journey_date, scraped_at) AS days_to_departure,
+                   MIN(price) AS min_price, AVG(price) AS avg_price, SUM(seats_available) AS seats_available,
+                   COUNT(*) AS bus_count
+            FROM {self.history_table}
+            WHERE journey_date BETWEEN %s AND %s
+              AND route_id IN (SELECT route_id FROM {self.routes_table} WHERE route = %s)
+            GROUP BY journey_date, scraped_at
+            ORDER BY journey_date, scraped_at
+        """, (start_date, end_date, route))
@@ -0,0 +1,235 @@
+import asyncio
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import parse_qsl, urlsplit
+import aiohttp
+from PageParser import parse_row
+
+SEARCH_URL = "https://www.redbus.in/search/SearchResults"
+HEADERS = {
+    'User-Agent': "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+                  "Chrome/91.0.4472.124 Safari/537.36",
+    'Accept': "application/json",
+    'Content-Type': "application/json",
+}
+PAGE_SIZE = 100
+# Maximum count of result pages read for a route
+MAX_PAGES = 50
+# City id parameters of search urls, route pages have them in search links and page state
+CITY_ID_NAMES = ['fromCityId', 'toCityId']
+CITY_ID_PATTERN = r'\b{0}["\']?\s*[:=]\s*["\']?(\d+)'
+
+
+def route_city_ids(route_link, page_source=''):
+    """
+    Finds city ids of a route in query of its link, or else in source of its route page. Route links collected in
+    service pages are paths without query, as '/bus-tickets/hyderabad-to-vijayawada'.
+    :param route_link: Route Link, or url route page was redirected to
+    :param page_source: HTML source of route page
+    :return: dictionary of fromCityId and toCityId, None when not found
+    """
+    query = dict(parse_qsl(urlsplit(route_link).query))
+    city_ids = {}
+    for name in CITY_ID_NAMES:
+        match = re.search(CITY_ID_PATTERN.format(name), page_source or '')
+        if query.get(name, '').isdigit():
+            city_ids[name] = query[name]
+        elif match:
+            city_ids[name] = match.group(1)
+    return city_ids if len(city_ids) == len(CITY_ID_NAMES) else None
+
+
+def search_params(city_ids, date, offset=0):
+    """
+    Builds query parameters of search results request.
+    :param city_ids: City ids of the route, from route_city_ids
+    :param date: Date to be searched, in '%d-%b-%Y' format
+    :param offset: Count of buses to skip, for pagination of results
+    :return: dictionary of query parameters
+    """
+    return {
+        'fromCity': city_ids['fromCityId'],
+        'toCity': city_ids['toCityId'],
+        'DOJ': date,
+        'sectionId': 0,
+        'groupId': 0,
+        'limit': PAGE_SIZE,
+        'offset': offset,
+        'sort': 0,
+        'sortOrder': 0,
+        'meta': 'true',
+        'returnSearch': 0,
+    }
+
+
+def format_time(value):
+    """
+    Converts 'YYYY-MM-DD HH:MM:SS' date time of search results to 'HH:MM' shown in search result page.
+    :param value: date time text
+    :return: time text, None when not available
+    """
+    if not value:
+        return None
+    return datetime.strptime(value, "%Y-%m-%d %H:%M:%S").strftime("%H:%M")
+
+
+def format_duration(minutes):
+    """
+    Converts duration minutes of search results to 'HHh MMm' shown in search result page.
+    :param minutes: duration in minutes
+    :return: duration text, None when not available
+    """
+    if minutes is None:
+        return None
+    hours, minutes = divmod(int(minutes), 60)
+    return f"{hours:02}h {minutes:02}m"
+
+
+def parse_search_response(payload, route_name, route_link):
+    """
+    Converts search results json into the same rows as Scraper.scrape_data.
+    :param payload: json of search results response
+    :param route_name: Route Name to be added in scraped data
+    :param route_link: Route Link to be added in scraped data
+    :return: scraped data of the route
+    :rtype List[List]
+    """
+    page_data = []
+    for bus in payload.get('inv') or []:
+        rating = (bus.get('rt') or {}).get('totRt')
+        fares = bus.get('frLst') or []
+        price = bus.get('minfr', min(fares) if fares else None)
+        seats = bus.get('nsa')
+        values = [bus.get('Tvs'), bus.get('bt'), format_time(bus.get('dt')), format_duration(bus.get('dur')),
+                  format_time(bus.get('at')), None if rating is None else str(rating),
+                  None if price is None else str(price), None if seats is None else str(seats)]
+        page_data.append(parse_row(route_name, route_link, values))
+    return page_data
+
+
+class HttpScraper:
+    """
+    Scrapes search results of routes over HTTP without a browser, routes are requested concurrently over a pooled
+    connection session. Browser is needed only to collect route links. City ids of a route are read from its route
+    page when its link has none, and kept for later requests.
+    SEARCH_URL and the response fields read by parse_search_response are not verified against a recorded response of
+    the live site yet, so this backend is not offered in the Streamlit app.
+
+    :param search_url: URL of search results endpoint (default: SEARCH_URL)
+    :param concurrency: Maximum count of requests in flight, also size of connection pool (default: 100).
+    :param timeout: Seconds to wait for a route's response (default: 20).
+    """
+    def __init__(self, search_url=SEARCH_URL, concurrency=100, timeout=20):
+        self.search_url = search_url
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self._city_ids = {}
+
+    async def resolve_city_ids(self, session, route_link):
+        """
+        City ids of a route, route page is requested when route link has none.
+        :param session: aiohttp ClientSession to send requests with
+        :param route_link: Route Link collected in service page
+        :return: dictionary of fromCityId and toCityId
+        :raise ValueError: when route page has no city ids
+        """
+        if route_link not in self._city_ids:
+            city_ids = route_city_ids(route_link)
+            if city_ids is None:
+                async with session.get(route_link, headers={'Accept': "text/html"}) as response:
+                    response.raise_for_status()
+                    city_ids = route_city_ids(str(response.url), await response.text())
+            if city_ids is None:
+                raise ValueError(f"City ids of route are not found: {route_link}")
+            self._city_ids[route_link] = city_ids
+        return self._city_ids[route_link]
+
+    async def fetch_route(self, session, route_name, route_link, date):
+        """
+        Requests all result pages of a route, at most MAX_PAGES. Paging stops early when a page has only rows of
+        earlier pages, as from a server ignoring offset.
+        :param session: aiohttp ClientSession to send requests with
+        :param route_name: Route Name to be added in scraped data
+        :param route_link: Route Link collected in service page
+        :param date: Date to be searched, in '%d-%b-%Y' format
+        :return: scraped data of the route
+        """
+        city_ids = await self.resolve_city_ids(session, route_link)
+        route_data = []
+        seen_rows = set()
+        for page in range(MAX_PAGES):
+            async with session.post(self.search_url, params=search_params(city_ids, date, page * PAGE_SIZE),
+                                    json={}) as response:
+                response.raise_for_status()
+                payload = await response.json(content_type=None)
+            page_data = parse_search_response(payload, route_name, route_link)
+            page_rows = {tuple(row) for row in page_data}
+            if page_rows and page_rows <= seen_rows:
+                print(f"Route {route_name} repeated results of earlier pages, paging stopped")
+                return route_data
+            seen_rows |= page_rows
+            route_data += page_data
+            if len(page_data) < PAGE_SIZE:
+                return route_data
+        print(f"Route {route_name} has more than {MAX_PAGES} pages, remaining pages are not read")
+        return route_data
+
+    async def scrape_routes_async(self, routes, date, on_route=None):
+        """
+        Coroutine of scrape_routes.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        results = [None] * len(routes)
+        loop = asyncio.get_running_loop()
+        # on_route may block, e.g. on a full StreamingWriter queue, it runs in a thread so requests continue
+        store_executor = ThreadPoolExecutor(max_workers=1)
+        store_failed = threading.Event()
+
+        def store(position, route_data):
+            if store_failed.is_set():  # Routes queued before an earlier error reached the event loop
+                return
+            try:
+                on_route(position, route_data)
+            except BaseException:
+                store_failed.set()
+                raise
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=HEADERS) as session:
+            async def scrape(position, route_name, route_link):
+                async with semaphore:
+                    try:
+                        results[position] = await self.fetch_route(session, route_name, route_link, date)
+                    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                        print(f"Route {route_name} generated an exception: {e}")
+                        return
+                if on_route:
+                    await loop.run_in_executor(store_executor, store, position, results[position])
+
+            scrapes = [asyncio.ensure_future(scrape(position, route_name, route_link))
+                       for position, (_, route_name, route_link) in enumerate(routes)]
+            try:
+                await asyncio.gather(*scrapes)
+            except BaseException:  # on_route failed, remaining routes are not scraped
+                for task in scrapes:
+                    task.cancel()
+                await asyncio.gather(*scrapes, return_exceptions=True)
+                raise
+            finally:
+                store_executor.shutdown()
+        return results
+
+    def scrape_routes(self, routes, date, on_route=None):
+        """
+        Scrapes search results of routes concurrently.
+        :param routes: list of (index, route name, route link) tuples, as collected by Scraper.enumerate_service_routes
+        :param date: Date to be searched, in '%d-%b-%Y' format
+        :param on_route: Method called with position of the route in routes and its scraped data, as soon as a route
+         is scraped. It is called in a separate thread, one route at a time, so it can block without stalling
+         requests. An error of on_route stops scraping and is raised.
+        :return: list of scraped data of every route in the same order as routes, None for failed routes
+        """
+        return asyncio.run(self.scrape_routes_async(routes, date, on_route))
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from lxml import etree, html
+
+# Class names of the fields in a bus row, in the order they are stored in scraped data
+ROW_FIELD_CLASSES = ['travels', 'bus-type', 'dp-time', 'dur', 'bp-time', 'rating-sec', 'fare d-block', 'seat-left']
+
+ROW_XPATH = etree.XPath("//li[contains(@class,'row-sec clearfix')]")
+FIELD_XPATH = etree.XPath("descendant::div[contains(@class,$field)]")
+
+
+def parse_row(route_name, route_link, values, default="null"):
+    """
+    Converts raw text values of a bus row into a scraped data row, parsing rating, price and seats in one pass.
+    :param route_name: Route Name to be added in scraped data
+    :param route_link: Route Link to be added in scraped data
+    :param values: Texts of the row fields in ROW_FIELD_CLASSES order, None for missing fields
+    :param default: Value used for missing text fields (default:'null')
+    :return: scraped data row
+    :rtype List
+    """
+    bus_name, bus_type, dp_time, duration, des_time, rating_text, price_value, seats_value = (
+        default if value is None else value for value in values)
+    try:
+        if rating_text and rating_text.replace('.', '', 1).isdigit():
+            rating = round(float(rating_text), 1)
+        else:
+            rating = None
+    except ValueError:
+        rating = None
+    try:
+        price_str = re.sub(r'[^\d.]+', '', price_value)
+        price = "{:.2f}".format(float(price_str)) if price_str else None
+    except ValueError:
+        price = None
+    try:
+        seats_str = re.sub(r'[^\d]+', '', seats_value)
+        seats_available = int(seats_str) if seats_str else None
+    except ValueError:
+        seats_available = None
+    return [route_name, route_link, bus_name, bus_type, dp_time, duration, des_time, rating, price, seats_available]
+
+
+def parse_page_source(page_source, route_name, route_link):
+    """
+    Parses the saved source of a fully loaded route page, without a browser.
+    :param page_source: HTML source of the route search result page
+    :param route_name: Route Name to be added in scraped data
+    :param route_link: Route Link to be added in scraped data
+    :return: scraped data of the page, same rows as Scraper.scrape_data
+    :rtype List[List]
+    """
+    if not page_source:
+        return []
+    tree = html.fromstring(page_source)
+    page_data = []
+    for row in ROW_XPATH(tree):
+        values = []
+        for field in ROW_FIELD_CLASSES:
+            elements = FIELD_XPATH(row, field=field)
+            values.append(elements[0].text_content().strip() if elements else None)
+        page_data.append(parse_row(route_name, route_link, values))
+    return page_data
+
+
+def save_snapshot(snapshot_dir, route_name, route_link, date, page_source):
+    """
+    Saves the page source of a route page with its details, to be parsed later.
+    :param snapshot_dir: Directory where snapshots are stored
+    :param route_name: Route Name of the page
+    :param route_link: Route Link of the page
+    :param date: Date of the scraped data
+    :param page_source: HTML source of the page
+    :return: path of the saved snapshot
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    key = hashlib.sha1(f"{route_link}|{date}".encode()).hexdigest()[:16]
+    path = os.path.join(snapshot_dir, f"{date}_{key}.json")
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump({'route_name': route_name, 'route_link': route_link, 'date': date, 'page_source': page_source},
+                  file)
+    return path
+
+
+def create_run_dir(snapshot_dir, date):
+    """
+    Creates a new directory for the snapshots of a scrape run, so snapshots left by earlier runs of the same date
+    are not parsed again with it.
+    :param snapshot_dir: Directory where snapshots are stored
+    :param date: Date of the scraped data
+    :return: path of the run directory
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    return tempfile.mkdtemp(prefix=f"run_{date}_", dir=snapshot_dir)
+
+
+def parse_snapshot(path):
+    """
+    Parses a snapshot saved with save_snapshot.
+    :param path: path of the snapshot
+    :return: scraped data of the snapshot page
+    :rtype List[List]
+    """
+    with open(path, encoding='utf-8') as file:
+        snapshot = json.load(file)
+    return parse_page_source(snapshot['page_source'], snapshot['route_name'], snapshot['route_link'])
+
+
+def parse_snapshots_in_parallel(snapshot_dir, date=None, process_count=None):
+    """
+    Parses all snapshots in a directory using a process pool.
+    :param snapshot_dir: Directory where snapshots are stored
+    :param date: Only snapshots of this date are parsed when given
+    :param process_count: Count of processes to use, defaults to number of CPUs
+    :return: scraped data of all snapshots
+    :rtype List[List]
+    """
+    prefix = f"{date}_" if date else ""
+    paths = sorted(os.path.join(snapshot_dir, name) for name in os.listdir(snapshot_dir)
+                   if name.startswith(prefix) and name.endswith('.json'))
+    parsed_data = []
+    if not paths:
+        return parsed_data
+    with ProcessPoolExecutor(max_workers=process_count) as executor:
+        for page_data in executor.map(parse_snapshot, paths):
+            parsed_data += page_data
+    return parsed_data
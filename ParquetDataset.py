@@ -0,0 +1,116 @@
+import os
+import shutil
+import uuid
+from urllib.parse import quote
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from DataHandler import TABLE_COLUMNS, prepare_row
+
+# Columns stored in data files, journey_date and route are stored in partition directory names
+FILE_SCHEMA = pa.schema([
+    ('url', pa.string()),
+    ('bus_id', pa.string()),
+    ('bus_type', pa.string()),
+    ('departure_time', pa.duration('s')),
+    ('duration', pa.string()),
+    ('arrival_time', pa.duration('s')),
+    ('rating', pa.float64()),
+    ('price', pa.float64()),
+    ('seats_available', pa.int32()),
+    ('is_ac', pa.int8()),
+    ('seat_class', pa.string()),
+    ('duration_minutes', pa.int16()),
+    ('departure_minute', pa.int16()),
+])
+PARTITIONING = ds.partitioning(pa.schema([('journey_date', pa.date32()), ('route', pa.string())]), flavor='hive')
+# Columns read by Select Bus page
+READ_COLUMNS = ['route', 'url', 'bus_id', 'bus_type', 'departure_time', 'duration', 'arrival_time', 'rating', 'price',
+                'seats_available', 'journey_date', 'is_ac', 'seat_class', 'duration_minutes', 'departure_minute']
+
+
+def time_to_seconds(value):
+    """
+    Converts 'HH:MM:SS' time of database values to seconds since midnight.
+    :param value: time text
+    :return: seconds, None when not available
+    """
+    if value is None:
+        return None
+    hours, minutes, seconds = value.split(':')
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+
+class ParquetDataset:
+    """
+    Parquet dataset of scraped data, in hive partition directories as
+    '<path>/journey_date=2024-10-17/route=<route name>/<file>.parquet'. Files are read with memory mapping and only
+    the needed columns are decoded, much faster than fetching the table row by row. Old journey dates can be kept as
+    archive or removed by deleting their directories.
+
+    Data of a route and date written again by the same instance is added to its directory, data written by an
+    earlier instance is replaced, so every scrape replaces the routes it scraped.
+    :param path: Directory of the dataset, created when not present.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._written = set()
+
+    def partition_dir(self, journey_date, route):
+        """
+        Directory of a route and date, route name is URI encoded same as pyarrow hive partitioning.
+        :param journey_date: date of the scraped data
+        :param route: Route Name
+        :return: directory path
+        """
+        return os.path.join(self.path, f"journey_date={journey_date}", f"route={quote(route, safe='')}")
+
+    def write(self, data, journey_date):
+        """
+        Writes scraped data, a file for every route in data.
+        :param data: scraped data
+        :param journey_date: Date of the scraped data, date or text in '%d-%b-%Y' format
+        :return: count of rows written
+        """
+        if journey_date is None:
+            raise ValueError("journey_date is needed to write dataset")
+        routes = {}
+        for row in data:
+            values = prepare_row(row, journey_date)
+            routes.setdefault((values[TABLE_COLUMNS.index('journey_date')], values[0]), []).append(values)
+        for (row_date, route), rows in routes.items():
+            directory = self.partition_dir(row_date, route)
+            if (row_date, route) not in self._written:
+                shutil.rmtree(directory, ignore_errors=True)
+                self._written.add((row_date, route))
+            os.makedirs(directory, exist_ok=True)
+            columns = {name: [row[TABLE_COLUMNS.index(name)] for row in rows] for name in FILE_SCHEMA.names}
+            for name in ['departure_time', 'arrival_time']:
+                columns[name] = [time_to_seconds(value) for value in columns[name]]
+            columns['price'] = [None if value is None else float(value) for value in columns['price']]
+            pq.write_table(pa.table(columns, schema=FILE_SCHEMA),
+                           os.path.join(directory, f"part-{uuid.uuid4().hex}.parquet"), compression='zstd')
+        return len(data)
+
+    def version(self):
+        """
+        Cheap probe of dataset version, changes whenever a file is written or removed, as it changes the
+        modification time of its directory.
+        :return: tuple of count of files and latest directory modification time
+        """
+        file_count, latest = 0, 0
+        for root, _, files in os.walk(self.path):
+            file_count += len(files)
+            latest = max(latest, os.stat(root).st_mtime_ns)
+        return file_count, latest
+
+    def read(self, columns=READ_COLUMNS, filters=None):
+        """
+        Reads the dataset into a DataFrame, memory mapping the files and decoding only given columns.
+        :param columns: Columns to be read (default: READ_COLUMNS)
+        :param filters: pyarrow filters on columns, partitions not matching journey_date and route filters are not
+         read, e.g. [('journey_date', '=', date(2024, 10, 17))]
+        :return: DataFrame with departure_time and arrival_time as timedelta, same as MySQL TIME columns
+        """
+        table = pq.read_table(self.path, columns=columns, filters=filters, memory_map=True, partitioning=PARTITIONING)
+        return table.to_pandas()
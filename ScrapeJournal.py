@@ -0,0 +1,69 @@
+import json
+import sqlite3
+import threading
+from datetime import datetime
+
+
+class ScrapeJournal:
+    """
+    Checkpoint journal stored in a local SQLite file, records every scraped route with its data so an interrupted
+    scrape can be resumed without scraping completed routes again.
+    :param path: Path of the journal file, created when not present.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS scraped_routes (
+                service INTEGER NOT NULL,
+                route_name TEXT,
+                route_link TEXT NOT NULL,
+                date TEXT NOT NULL,
+                data TEXT NOT NULL,
+                scraped_at TEXT NOT NULL,
+                PRIMARY KEY (date, service, route_link)
+            )
+        """)
+        self.connection.commit()
+
+    def record(self, service, route_name, route_link, date, data):
+        """
+        Records a completed route, committed immediately so it survives a crash.
+        :param service: Index of the service of the route
+        :param route_name: Route Name of the route
+        :param route_link: Route Link of the route
+        :param date: Date of the scraped data
+        :param data: Scraped data of the route
+        """
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO scraped_routes VALUES (?, ?, ?, ?, ?, ?)",
+                (service, route_name, route_link, date, json.dumps(data or []), datetime.now().isoformat()))
+            self.connection.commit()
+
+    def completed(self, date):
+        """
+        Returns routes already completed for a date.
+        :param date: Date of the scraped data
+        :return: dictionary of (service, route link) to its scraped data
+        """
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT service, route_link, data FROM scraped_routes WHERE date = ?", (date,)).fetchall()
+        return {(service, route_link): json.loads(data) for service, route_link, data in rows}
+
+    def clear(self, date):
+        """
+        Removes all recorded routes of a date, to start a fresh scrape.
+        :param date: Date of the scraped data
+        """
+        with self._lock:
+            self.connection.execute("DELETE FROM scraped_routes WHERE date = ?", (date,))
+            self.connection.commit()
+
+    def close(self):
+        """Closes the journal file"""
+        with self._lock:
+            self.connection.close()
@@ -1,15 +1,139 @@
-import re
+import json
+import queue
+import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from selenium.common import NoSuchElementException, TimeoutException
+from contextlib import contextmanager
+from selenium.common import NoSuchElementException, TimeoutException, WebDriverException
 from selenium.webdriver import ActionChains, Keys
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support import expected_conditions as ec
 from selenium import webdriver
-import time
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.wait import WebDriverWait
 from datetime import datetime, timedelta
-from DataHandler import DataHandler
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from DataHandler import DataHandler, StreamingWriter
+from HttpScraper import HttpScraper
+from PageParser import ROW_FIELD_CLASSES, create_run_dir, parse_row, parse_snapshots_in_parallel, save_snapshot
+from ScrapeJournal import ScrapeJournal
+
+# Reads the text of every field of every bus row in a single round-trip
+BULK_ROWS_JS = """
+var fields = arguments[0];
+var rows = document.querySelectorAll("li[class*='row-sec clearfix']");
+var data = [];
+for (var i = 0; i < rows.length; i++) {
+    var values = [];
+    for (var j = 0; j < fields.length; j++) {
+        var element = rows[i].querySelector("div[class*='" + fields[j] + "']");
+        values.push(element ? element.innerText.trim() : null);
+    }
+    data.push(values);
+}
+return data;
+"""
+
+# Resolves once the observed node has had no mutations for quiet period and the browser is idle
+WAIT_FOR_SETTLED_JS = """
+var xpath = arguments[0], quietMs = arguments[1], done = arguments[arguments.length - 1];
+var target = xpath ? document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE,
+    null).singleNodeValue : null;
+var version = 0, timer = null;
+var observer = new MutationObserver(function () {
+    version++;
+    window.scrollTo(0, document.body.scrollHeight);  // Keep triggering lazy loading of the list
+    arm();
+});
+function finish(armedVersion) {
+    if (armedVersion !== version) {
+        return;  // List changed while waiting for idle, a new timer is already armed
+    }
+    observer.disconnect();
+    done(document.body.scrollHeight);
+}
+function arm() {
+    var armedVersion = version;
+    clearTimeout(timer);
+    timer = setTimeout(function () {
+        if (window.requestIdleCallback) {
+            window.requestIdleCallback(function () { finish(armedVersion); }, {timeout: quietMs});
+        } else {
+            finish(armedVersion);
+        }
+    }, quietMs);
+}
+observer.observe(target || document.body, {childList: true, subtree: true});
+window.scrollTo(0, document.body.scrollHeight);
+arm();
+"""
+
+XPATH_EXISTS_JS = """
+return document.evaluate(arguments[0], document, null, XPathResult.FIRST_ORDERED_NODE_TYPE,
+    null).singleNodeValue !== null;
+"""
+
+# Resources not needed to scrape bus data, blocked in browser through Chrome DevTools Protocol. Patterns of file
+# types end with '*' to also match urls with a query string.
+DEFAULT_BLOCKED_URLS = [
+    # Images and fonts
+    '*.png*', '*.jpg*', '*.jpeg*', '*.gif*', '*.webp*', '*.svg*', '*.ico*', '*.woff*', '*.ttf*', '*.otf*', '*.eot*',
+    # Ads, analytics and trackers
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*', '*googlesyndication.com*',
+    '*googleadservices.com*', '*facebook.net*', '*connect.facebook.com*', '*hotjar.com*', '*clarity.ms*',
+    '*branch.io*', '*moengage.com*', '*criteo.com*', '*taboola.com*', '*newrelic.com*', '*nr-data.net*',
+]
+
+BUS_LIST_XPATH = "(//ul[@class='bus-items'])[1]"
+NO_BUSES_XPATH = "//div[text()='Oops! No buses found.']"
+
+
+def build_search_url(route_link, date):
+    """
+    Builds the search result url of a route for a date, RedBus reads the journey date from 'onward' parameter.
+    :param route_link: Route Link collected from service page
+    :param date: Date to be searched, in '%d-%b-%Y' format
+    :return: url of search result page
+    """
+    datetime.strptime(date, "%d-%b-%Y")  # Raises ValueError for dates in other formats
+    parts = urlsplit(route_link)
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True) if key != 'onward']
+    query.append(('onward', date))
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+class NetworkStats:
+    """
+    Counters of network requests of browser sessions, read from Chrome performance logs.
+    Size of blocked requests is not known as they are never fetched, compare loaded_bytes of runs with and without
+    the block list to measure bytes saved.
+    """
+    def __init__(self):
+        self.blocked_requests = 0
+        self.loaded_requests = 0
+        self.loaded_bytes = 0
+        self._lock = threading.Lock()
+
+    def update(self, log_entries):
+        """
+        Adds requests of performance log entries to the counters.
+        :param log_entries: Entries returned by driver.get_log('performance')
+        """
+        blocked = loaded = loaded_bytes = 0
+        for entry in log_entries:
+            message = json.loads(entry['message'])['message']
+            if message['method'] == 'Network.loadingFailed' and message['params'].get('blockedReason'):
+                blocked += 1
+            elif message['method'] == 'Network.loadingFinished':
+                loaded += 1
+                loaded_bytes += int(message['params'].get('encodedDataLength', 0))
+        with self._lock:
+            self.blocked_requests += blocked
+            self.loaded_requests += loaded
+            self.loaded_bytes += loaded_bytes
+
+    def __str__(self):
+        return (f"Blocked requests: {self.blocked_requests}, Loaded requests: {self.loaded_requests}, "
+                f"Loaded bytes: {self.loaded_bytes}")
 
 
 class Scraper:
@@ -19,11 +143,24 @@ class Scraper:
        :param url: The URL to be scraped.
        :param date: The specific date for which data needs to be fetched.
        :param headless: Boolean flag to indicate whether the browser should run in headless mode (default: False).
+       :param bulk_extract: Boolean flag to read all bus rows with a single script call (default: True).
+       :param snapshot_dir: When given, route pages are saved in this directory to be parsed later instead of
+        being scraped in the browser.
+       :param driver: Already opened driver to be used, e.g. from DriverPool. It is not quit by quit_driver.
+       :param direct_navigation: Boolean flag to open search result urls directly in the current window instead of
+        opening routes in new windows and selecting the date in calendar (default: True).
        """
 
-    def __init__(self, url, date, headless=False):
+    def __init__(self, url, date, headless=False, bulk_extract=True, snapshot_dir=None, driver=None,
+                 direct_navigation=True):
         self.date_to_be_fetched = date
-        if headless:
+        self.direct_navigation = direct_navigation
+        self.bulk_extract = bulk_extract
+        self.snapshot_dir = snapshot_dir
+        self.owns_driver = driver is None
+        if driver is not None:
+            self.driver = driver
+        elif headless:
             self.driver = self.setup_driver_with_headless(url)
         else:
             self.driver = self.setup_driver(url)
@@ -36,11 +173,11 @@ class Scraper:
         """
         try:
             if element:
-                self.driver.execute_script("arguments[0].scrollIntoView({ behavior: 'smooth', block: 'center'});",
+                self.driver.execute_script("arguments[0].scrollIntoView({ behavior: 'instant', block: 'center'});",
                                            element)
             elif xpath:
                 scroll_element = self.driver.find_element(By.XPATH, xpath)
-                self.driver.execute_script("arguments[0].scrollIntoView({ behavior: 'smooth', block: 'center'});",
+                self.driver.execute_script("arguments[0].scrollIntoView({ behavior: 'instant', block: 'center'});",
                                            scroll_element)
         except Exception as e:
             # self.capture_full_page_screenshot("error_screenshot")
@@ -51,6 +188,11 @@ class Scraper:
         Search buses data for given Data
         :param date : Date to be searched.
         """
+        if self.direct_navigation:  # Calendar is not needed, works for dates of any month
+            self.driver.get(build_search_url(self.driver.current_url, date))
+            return
+
+        # Calendar shows current month, so only dates of current month can be selected here
         day_xpath = "//span[contains(@class,'CalendarDays') and .='{0}']"
 
         # Extracting day from date to pass in xpath, and removing 0 in 09 to work in day_xpath
@@ -75,6 +217,45 @@ class Scraper:
         self.scroll_to_element(element=clickable_element)
         clickable_element.click()
 
+    def xpath_exists(self, xpath):
+        """
+        Checks presence of an element in a single script call, without waiting for implicit wait.
+        :param xpath: XPATH of an WebElement.
+        :return: boolean True when present, else False
+        """
+        return bool(self.driver.execute_script(XPATH_EXISTS_JS, xpath))
+
+    def wait_for_dom_settled(self, xpath=None, quiet_ms=300, timeout=10):
+        """
+        Waits until the element stopped changing, observed in page with a MutationObserver.
+        :param xpath: XPATH of an WebElement to observe, whole document is observed when not given.
+        :param quiet_ms: Milliseconds without mutation after which element is considered loaded (Default: 300)
+        :param timeout: Timeout seconds to wait, (Default: 10)
+        """
+        self.driver.set_script_timeout(timeout)
+        try:
+            self.driver.execute_async_script(WAIT_FOR_SETTLED_JS, xpath, quiet_ms)
+        except TimeoutException:  # Raised by selenium when async script times out
+            print(f"Page was still changing after {timeout} seconds, proceeding")
+
+    def wait_for_search_results(self, timeout=10):
+        """
+        Waits until search result shows a bus list or the no buses message.
+        :param timeout: Timeout seconds to wait, (Default: 10)
+        :return: 'buses', 'empty', or None when neither appeared in time
+        """
+        def result_state(driver):
+            if self.xpath_exists(NO_BUSES_XPATH):
+                return 'empty'
+            if self.xpath_exists(BUS_LIST_XPATH):
+                return 'buses'
+            return None
+
+        try:
+            return WebDriverWait(self.driver, timeout, poll_frequency=0.1).until(result_state)
+        except TimeoutException:
+            return None
+
     def page_load_js(self, xpath):
         """
         Custom method to reload a dynamic list on a page using XPath.
@@ -103,30 +284,20 @@ class Scraper:
         }
         """
         self.driver.execute_script(js_script, xpath)
-        previous_height = self.driver.execute_script("return document.body.scrollHeight")
-
-        while True:
-            self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(.1)
-            new_height = self.driver.execute_script("return document.body.scrollHeight")
 
-            # Break the loop if no new content is loaded (i.e., list fully loaded)
-            if new_height == previous_height:
-                break
-            previous_height = new_height
+        # Scroll until the list stops growing (i.e., list fully loaded)
+        self.wait_for_dom_settled(xpath)
 
     def select_view_buses_and_load_page(self):
         """
         Method to select view buses button and loads search result list for selected button
         """
-        if self.safe_find_element_text(By.XPATH, "(//div[text()='View Buses'])[1]", timeout=1) != "null":
-            self.scroll_to_element(xpath="(//div[text()='View Buses'])[1]")
-            time.sleep(1)
+        if self.xpath_exists("(//div[text()='View Buses'])[1]"):
             buttons = self.driver.find_elements(By.XPATH, "//div[text()='View Buses']")
             no_of_buttons = len(buttons)
             list_xpath = "(//ul[@class='bus-items'])[{0}]"  # List element needs to be refreshed
             for z in range(no_of_buttons):
-                time.sleep(1)
+                # click_element waits for the button to be clickable
                 self.click_element(By.XPATH, "(//div[text()='View Buses'])[1]")  # Xpath of View Buses
                 self.page_load_js(list_xpath.format(z + 1))
 
@@ -145,28 +316,55 @@ class Scraper:
         # Switching to parent window
         self.driver.switch_to.window(self.driver.window_handles[1])
         self.modify_date_and_search(self.date_to_be_fetched)
-
-        page_data = None
-        bus_not_found_element = self.driver.find_elements(By.XPATH, "//div[text()='Oops! No buses found.']")
-        if not bus_not_found_element:  # Proceed with scraping if buses are found.
-            bus_list = self.driver.find_elements(By.XPATH, "(//ul[@class='bus-items'])[1]")
-
-            if bus_list:
-                self.page_load_js("(//ul[@class='bus-items'])[1]")  # Refresh the List
-            self.select_view_buses_and_load_page()
-            # Scraping data and storing in data
-            page_data = self.scrape_data(route_name, route_link)
+        page_data = self.scrape_loaded_route(route_name, route_link)
 
         # Closing and switching to parent window
         self.driver.close()
         self.driver.switch_to.window(self.driver.window_handles[0])
         return page_data
 
-    def navigate_to_pages_and_collect_data(self, page_css_selector):
+    def scrape_route(self, route_name, route_link):
+        """
+        Opens a route link in the current window and scrapes its data for the date to be fetched.
+        :param route_name: Route Name to be added in scraped data
+        :param route_link: Route Link to be opened
+        :returns scraped date of the route page.
+        """
+        if self.direct_navigation:
+            self.driver.get(build_search_url(route_link, self.date_to_be_fetched))
+        else:
+            self.driver.get(route_link)
+            self.modify_date_and_search(self.date_to_be_fetched)
+        return self.scrape_loaded_route(route_name, route_link)
+
+    def scrape_loaded_route(self, route_name, route_link):
+        """
+        Loads the complete bus list of the searched route page in current window and scrapes it.
+        :param route_name: Route Name to be added in scraped data
+        :param route_link: Route Link to be added in scraped data
+        :returns scraped date of the page, None when no buses are found or page is saved as snapshot.
+        """
+        page_data = None
+        result_state = self.wait_for_search_results()
+        if result_state != 'empty':  # Proceed with scraping if buses are found.
+            if result_state == 'buses':
+                self.page_load_js(BUS_LIST_XPATH)  # Refresh the List
+            self.select_view_buses_and_load_page()
+            if self.snapshot_dir:  # Saving loaded page to be parsed later, browser is free for next route
+                save_snapshot(self.snapshot_dir, route_name, route_link, self.date_to_be_fetched,
+                              self.driver.page_source)
+            else:
+                # Scraping data and storing in data
+                page_data = self.scrape_data(route_name, route_link)
+        return page_data
+
+    def navigate_to_pages_and_collect_data(self, page_css_selector, route_handler=None):
         """
         Clicks on page elements specified by CSS selector and collects data from all pages.
         :param page_css_selector: CSS SELECTOR of WebElement to be navigated
+        :param route_handler: Method called with the collected list for every page (Default: fetch_route_details)
         """
+        route_handler = route_handler or self.fetch_route_details
         pages_data = []
         try:
             WebDriverWait(self.driver, 10).until(
@@ -175,17 +373,31 @@ class Scraper:
             pages = self.driver.find_elements(By.CSS_SELECTOR, page_css_selector)
 
             # Loop through the page elements
-            for page in pages:
+            for page_number, page in enumerate(pages):
+                first_route = self.driver.find_elements(By.CSS_SELECTOR, ".route_details a")[:1]
+                WebDriverWait(self.driver, 10).until(ec.element_to_be_clickable(page))
                 self.scroll_to_element(element=page)  # Scrolling to page element
-                time.sleep(1)
                 page.click()
-                self.fetch_route_details(pages_data)
+                if page_number and first_route:  # Waiting for routes of previous page to be replaced
+                    try:
+                        WebDriverWait(self.driver, 10).until(ec.staleness_of(first_route[0]))
+                    except TimeoutException:
+                        print(f"Routes did not change after opening page {page_number + 1}")
+                route_handler(pages_data)
 
         except (TimeoutException, NoSuchElementException):
             # print("Pages is not available, single page to fetch")
-            self.fetch_route_details(pages_data)
+            route_handler(pages_data)
         return pages_data
 
+    def collect_route_links(self, routes_list):
+        """
+        Collects route names and links of the current page without opening them.
+        :param routes_list: List to which (route name, route link) tuples are added
+        """
+        url_elements = self.driver.find_elements(By.CSS_SELECTOR, ".route_details a")
+        routes_list += [(elem.text, elem.get_attribute('href')) for elem in url_elements]
+
     def fetch_route_details(self, pages_list):
         # Element of Route names to fetch href and text attribute
         url_elements = self.driver.find_elements(By.CSS_SELECTOR, ".route_details a")
@@ -229,6 +441,9 @@ class Scraper:
         :return scraped date of individual element page
         :rtype List[List]
         """
+        if self.bulk_extract:
+            return self.scrape_data_bulk(route_name, route_link)
+
         page_data = []
         d_xpath = "(//li[contains(@class,'row-sec clearfix')])[{0}]/descendant::div[contains(@class,'{1}')]"
         # Getting length of routes and scrolling to first element in page
@@ -237,41 +452,39 @@ class Scraper:
 
         # Looping and scrapping the data using dynamic xpath
         for x in range(1, data_size + 1):
-            bus_name = self.safe_find_element_text(By.XPATH, d_xpath.format(x, 'travels'))
-            bus_type = self.safe_find_element_text(By.XPATH, d_xpath.format(x, 'bus-type'))
-            dp_time = self.safe_find_element_text(By.XPATH, d_xpath.format(x, 'dp-time'))
-            duration = self.safe_find_element_text(By.XPATH, d_xpath.format(x, 'dur'))
-            des_time = self.safe_find_element_text(By.XPATH, d_xpath.format(x, 'bp-time'))
-            rating_text = self.safe_find_element_text(By.XPATH, d_xpath.format(x, 'rating-sec'))
-            try:
-                if rating_text and rating_text.replace('.', '', 1).isdigit():
-                    rating = round(float(rating_text), 1)
-                else:
-                    rating = None
-            except ValueError:
-                rating = None
-            try:
-                price_value = self.safe_find_element_text(By.XPATH, d_xpath.format(x, 'fare d-block'))
-                price_str = re.sub(r'[^\d.]+', '', price_value)
-                price = "{:.2f}".format(float(price_str)) if price_str else None
-            except ValueError:
-                price = None
-            try:
-                seats_value = self.safe_find_element_text(By.XPATH, d_xpath.format(x, 'seat-left'))
-                seats_str = re.sub(r'[^\d]+', '', seats_value)
-                seats_available = int(seats_str) if seats_str else None
-            except ValueError:
-                seats_available = None
-            raw = [route_name, route_link, bus_name, bus_type, dp_time, duration, des_time, rating, price,
-                   seats_available]
-            page_data.append(raw)
+            values = [self.safe_find_element_text(By.XPATH, d_xpath.format(x, field)) for field in ROW_FIELD_CLASSES]
+            page_data.append(parse_row(route_name, route_link, values))
         return page_data
 
+    def scrape_data_bulk(self, route_name, route_link):
+        """
+        Scrapes all bus rows of the page with one script call instead of one driver call per field.
+        :param route_name: Route Name to be added in scraped data
+        :param route_link: Route Link to be added in scraped data
+        :return scraped date of individual element page
+        :rtype List[List]
+        """
+        rows = self.driver.execute_script(BULK_ROWS_JS, ROW_FIELD_CLASSES) or []
+        return [parse_row(route_name, route_link, values) for values in rows]
+
     @staticmethod
-    def setup_driver_with_headless(url):
+    def block_network_requests(driver, blocked_urls):
+        """
+        Blocks requests of given url patterns in browser through Chrome DevTools Protocol.
+        :param driver: driver instance of chrome driver
+        :param blocked_urls: url patterns to be blocked, '*' matches any characters
+        """
+        if blocked_urls:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': list(blocked_urls)})
+
+    @staticmethod
+    def setup_driver_with_headless(url, blocked_urls=DEFAULT_BLOCKED_URLS, network_log=False):
         """
         Creates driver instance of chrome driver with chrome options to run in headless mode.
         :param url: url to open in browser.
+        :param blocked_urls: url patterns of requests to be blocked (default: DEFAULT_BLOCKED_URLS)
+        :param network_log: Boolean flag to enable performance log for NetworkStats (default: False)
         :return: created webdriver instance.
         """
         chrome_options = Options()
@@ -289,18 +502,23 @@ class Scraper:
         chrome_options.add_argument('--disk-cache-size=33554432')
         chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
         chrome_options.add_experimental_option('useAutomationExtension', False)
+        if network_log:
+            chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
         driver = webdriver.Chrome(options=chrome_options)
 
         driver.implicitly_wait(60)
         driver.set_page_load_timeout(60)
+        Scraper.block_network_requests(driver, blocked_urls)
         driver.get(url)
         return driver
 
     @staticmethod
-    def setup_driver(url):
+    def setup_driver(url, blocked_urls=DEFAULT_BLOCKED_URLS, network_log=False):
         """
         Creates driver instance of chrome driver with chrome options to increase speed of execution.
         :param url: url to open in browser.
+        :param blocked_urls: url patterns of requests to be blocked (default: DEFAULT_BLOCKED_URLS)
+        :param network_log: Boolean flag to enable performance log for NetworkStats (default: False)
         :return: created webdriver instance.
         """
         chrome_options = Options()
@@ -313,16 +531,20 @@ class Scraper:
         chrome_options.add_argument('--disable-smooth-scrolling')
         chrome_options.add_argument('--disable-dev-shm-usage')
         chrome_options.add_argument('--disk-cache-size=33554432')
+        if network_log:
+            chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
 
         driver = webdriver.Chrome(options=chrome_options)
         driver.maximize_window()
         driver.implicitly_wait(10)
+        Scraper.block_network_requests(driver, blocked_urls)
         driver.get(url)
         return driver
 
     def quit_driver(self):
-        """Quits driver instance"""
-        self.driver.quit()
+        """Quits driver instance, drivers given from outside are left open"""
+        if self.owns_driver:
+            self.driver.quit()
 
     def scrape_element(self, index):
         """
@@ -330,24 +552,193 @@ class Scraper:
             :param index: The index of the element to scrape.
             :return: A nested list containing the scraped data for all the specified element.
             """
+        if self.direct_navigation:  # Routes are collected first, as opening them leaves the service page
+            datas = []
+            for _, route_name, route_link in self.enumerate_service_routes(index):
+                page_data = self.scrape_route(route_name, route_link)
+                if page_data:  # Only add if valid data is returned
+                    datas += page_data
+            return datas
+
         print(f"Scraping from Service: {index}")
         xpath = f"(//div[@class='rtcCards'])[{index}]"
         self.click_element(By.XPATH, xpath)
         datas = self.navigate_to_pages_and_collect_data(".DC_117_paginationTable div")
         return datas
 
+    def enumerate_service_routes(self, index):
+        """
+        Collects routes of all pages for given index of elements, without scraping them.
+        :param index: The index of the element to enumerate.
+        :return: list of (index, route name, route link) tuples.
+        """
+        print(f"Collecting routes from Service: {index}")
+        xpath = f"(//div[@class='rtcCards'])[{index}]"
+        self.click_element(By.XPATH, xpath)
+        routes = self.navigate_to_pages_and_collect_data(".DC_117_paginationTable div", self.collect_route_links)
+        return [(index, route_name, route_link) for route_name, route_link in routes]
+
 
-def scrape_data_for_element(count, default_date=None):
+class DriverPool:
+    """
+    Pool of warm browser sessions handed out to scraping workers, so browsers are not started for every task.
+    Sessions are reset between tasks, and recycled after max_uses tasks or after a crash.
+
+    :param url: The URL new sessions are opened with.
+    :param size: Maximum count of browser sessions open at a time.
+    :param headless: Boolean flag to indicate whether the browsers should run in headless mode (default: False).
+    :param max_uses: Count of tasks after which a session is quit and replaced by a new one (default: 25).
+    :param blocked_urls: url patterns of requests to be blocked in all sessions (default: DEFAULT_BLOCKED_URLS)
+    :param network_stats: NetworkStats updated with requests of every session when it is released, performance log
+     is enabled in sessions only when given.
+    """
+
+    def __init__(self, url, size, headless=False, max_uses=25, blocked_urls=DEFAULT_BLOCKED_URLS,
+                 network_stats=None):
+        self.url = url
+        self.headless = headless
+        self.max_uses = max_uses
+        self.blocked_urls = blocked_urls
+        self.network_stats = network_stats
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = queue.LifoQueue()
+        self._uses = {}
+        self._lock = threading.Lock()
+
+    def _create_driver(self):
+        """Opens a new browser session"""
+        network_log = self.network_stats is not None
+        if self.headless:
+            driver = Scraper.setup_driver_with_headless(self.url, self.blocked_urls, network_log)
+        else:
+            driver = Scraper.setup_driver(self.url, self.blocked_urls, network_log)
+        with self._lock:
+            self._uses[id(driver)] = 0
+        return driver
+
+    def _reset_driver(self, driver):
+        """
+        Closes extra windows and clears cookies.
+        :param driver: driver to be reset
+        :return: boolean True when the session is healthy, else False
+        """
+        try:
+            handles = driver.window_handles
+            for handle in handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(handles[0])
+            driver.delete_all_cookies()
+            return True
+        except WebDriverException as e:
+            print(f"Browser session is not reusable: {e}")
+            return False
+
+    def _collect_network_stats(self, driver):
+        """Adds requests of a session to network_stats, reading the log also clears it in browser"""
+        if self.network_stats is None:
+            return
+        try:
+            self.network_stats.update(driver.get_log('performance'))
+        except WebDriverException as e:  # Log of a crashed session cannot be read
+            print(f"Network log of browser session is not readable: {e}")
+
+    def _discard_driver(self, driver):
+        """Quits a browser session, ignoring errors from crashed sessions"""
+        with self._lock:
+            self._uses.pop(id(driver), None)
+        try:
+            driver.quit()
+        except WebDriverException:
+            pass
+
+    def acquire(self, url=None):
+        """
+        Hands out a warm browser session, waits when all sessions are in use.
+        :param url: URL to be opened in the session before it is handed out
+        :return: webdriver instance
+        """
+        self._slots.acquire()
+        try:
+            try:
+                driver = self._idle.get_nowait()
+                fresh = False
+            except queue.Empty:
+                driver = self._create_driver()
+                fresh = True
+        except Exception:
+            self._slots.release()
+            raise
+        if url and (not fresh or url != self.url):
+            try:
+                driver.get(url)
+            except WebDriverException:
+                self.release(driver, broken=True)
+                raise
+        return driver
+
+    def release(self, driver, broken=False):
+        """
+        Returns a browser session to the pool.
+        :param driver: driver taken with acquire
+        :param broken: Boolean flag to discard the session, e.g. after a crash (default: False)
+        """
+        try:
+            with self._lock:
+                uses = self._uses.get(id(driver), 0) + 1
+                self._uses[id(driver)] = uses
+            self._collect_network_stats(driver)  # Before the session is reset or quit
+            if broken or uses >= self.max_uses or not self._reset_driver(driver):
+                self._discard_driver(driver)
+            else:
+                self._idle.put(driver)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def lease(self, url=None):
+        """
+        Context manager to acquire a browser session and release it after use
+        :param url: URL to be opened in the session before it is handed out
+        """
+        driver = self.acquire(url)
+        broken = False
+        try:
+            yield driver
+        except WebDriverException:
+            broken = True
+            raise
+        finally:
+            self.release(driver, broken)
+
+    def close(self):
+        """Quits all idle browser sessions"""
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard_driver(driver)
+
+
+def scrape_data_for_element(count, default_date=None, snapshot_dir=None, pool=None):
     """
     Opens a new browser session for each thread and scrapes data for a specific element.
     :param default_date: It will fetch tomorrow's date by default, else given date wil be used to scrape
     :param count: The index of the element to scrape.
+    :param snapshot_dir: When given, route pages are saved as snapshots instead of being scraped.
+    :param pool: DriverPool to take the browser session from, a new browser is opened when not given.
     :return: A nested list containing the scraped data for the specified element.
     """
 
     if default_date is None:
         default_date = (datetime.now() + timedelta(days=1)).strftime("%d-%b-%Y")
-    scraper = Scraper(URL, default_date, headless=False)  # Open a new browser for each thread
+    if pool is not None:
+        with pool.lease(URL) as driver:
+            scraper = Scraper(URL, default_date, snapshot_dir=snapshot_dir, driver=driver)
+            return scraper.scrape_element(count)
+
+    scraper = Scraper(URL, default_date, headless=False, snapshot_dir=snapshot_dir)  # Open a new browser
     try:
         scrape_data = scraper.scrape_element(count)
     finally:
@@ -355,45 +746,240 @@ def scrape_data_for_element(count, default_date=None):
     return scrape_data
 
 
-def scrape_data_in_parallel(thread_count=2, num_of_elements=10, date=None):
+def enumerate_routes_for_element(count, pool):
     """
-    Custom method to create separate driver instance and scrape data in parallel
+    Collects all routes of a specific element with a browser session from the pool.
+    :param count: The index of the element to enumerate.
+    :param pool: DriverPool to take the browser session from.
+    :return: list of (index, route name, route link) tuples.
+    """
+    with pool.lease(URL) as driver:
+        scraper = Scraper(URL, None, driver=driver)
+        return scraper.enumerate_service_routes(count)
+
+
+def scrape_route_worker(tasks, results, pool, date, snapshot_dir=None, journal=None, sink=None):
+    """
+    Takes routes from the shared queue and scrapes them until the queue is empty.
+    :param tasks: Queue of (task index, (index, route name, route link)) items shared by all workers
+    :param results: Dictionary where scraped data of every task index is stored
+    :param pool: DriverPool to take the browser sessions from.
+    :param date: Date of data to be scraped.
+    :param snapshot_dir: When given, route pages are saved as snapshots instead of being scraped.
+    :param journal: ScrapeJournal in which every completed route is recorded.
+    :param sink: When given, scraped data and name of every route are passed to its put method instead of results.
+     Errors of put are raised, so workers stop when data can no longer be written.
+    """
+    while True:
+        try:
+            task_index, (count, route_name, route_link) = tasks.get_nowait()
+        except queue.Empty:
+            return
+        try:
+            with pool.lease() as driver:
+                scraper = Scraper(URL, date, snapshot_dir=snapshot_dir, driver=driver)
+                route_data = scraper.scrape_route(route_name, route_link) or []
+            if journal:
+                journal.record(count, route_name, route_link, date, route_data)
+        except Exception as exc:
+            print(f"Route {route_name} of Element {count} generated an exception: {exc}")
+            continue
+        if sink:  # Pages saved as snapshots are put when they are parsed
+            sink.put(route_data, route=None if snapshot_dir else route_name)
+        else:
+            results[task_index] = route_data
+
+
+def scrape_services_in_parallel(thread_count, num_of_elements, date, snapshot_dir, pool, sink=None):
+    """
+    Scrapes every service in a separate task, routes of a service are scraped one after another.
     :param thread_count: Count of threads to use for execution
     :param num_of_elements: count of services data to be scraped from RedBus
-    :param date: Date of data to be scraped, If not provided will scrape tomorrow's date by default.
+    :param date: Date of data to be scraped.
+    :param snapshot_dir: When given, route pages are saved as snapshots instead of being scraped.
+    :param pool: DriverPool to take the browser sessions from.
+    :param sink: When given, scraped data of every service is passed to its put method instead of returned. Errors
+     of put are raised, services not started yet are not scraped then.
     :return: scraped data
     """
-    print(f"Start: {datetime.now()}")
-    parallel_scraped_data = []
-
-    # Using ThreadPoolExecutor for parallel execution
+    scraped_data = []
     with ThreadPoolExecutor(max_workers=thread_count) as executor:
         future_to_element = {}
         for count in range(1, num_of_elements + 1):
-            future = executor.submit(scrape_data_for_element, count, date)
+            future = executor.submit(scrape_data_for_element, count, date, snapshot_dir, pool)
             future_to_element[future] = count
-            time.sleep(0.5)
 
         # Process results as they complete
         for future in as_completed(future_to_element):
             count = future_to_element[future]
             try:
                 data = future.result()
-                if data:
-                    parallel_scraped_data += data
             except Exception as exc:
                 print(f"Element {count} generated an exception: {exc}")
+                continue
+            if data and sink:
+                try:
+                    sink.put(data)
+                except Exception:
+                    for pending in future_to_element:
+                        pending.cancel()
+                    raise
+            elif data:
+                scraped_data += data
+    return scraped_data
+
+
+def scrape_routes_in_parallel(thread_count, num_of_elements, date, snapshot_dir, pool, journal=None, sink=None,
+                              http_scraper=None):
+    """
+    Scrapes in two phases, first all routes of all services are collected, then the routes are scraped by all
+    threads from a shared queue, so no thread is idle while another service still has routes left.
+    :param thread_count: Count of threads to use for execution
+    :param num_of_elements: count of services data to be scraped from RedBus
+    :param date: Date of data to be scraped.
+    :param snapshot_dir: When given, route pages are saved as snapshots instead of being scraped.
+    :param pool: DriverPool to take the browser sessions from.
+    :param journal: ScrapeJournal to record completed routes in, routes already recorded in it are not scraped.
+    :param sink: When given, scraped data and name of every route are passed to its put method as soon as it is
+     scraped. Errors of put stop scraping and are raised.
+    :param http_scraper: When given, routes are scraped with this HttpScraper instead of browsers.
+    :return: scraped data, in the same order as scraping service by service, empty when sink is given
+    """
+    # Phase 1: Collecting (service, route name, route link) of all services
+    service_routes = {}
+    with ThreadPoolExecutor(max_workers=thread_count) as executor:
+        future_to_element = {executor.submit(enumerate_routes_for_element, count, pool): count
+                             for count in range(1, num_of_elements + 1)}
+        for future in as_completed(future_to_element):
+            count = future_to_element[future]
+            try:
+                service_routes[count] = future.result()
+            except Exception as exc:
+                print(f"Element {count} generated an exception: {exc}")
+    routes = [route for count in sorted(service_routes) for route in service_routes[count]]
+    print(f"Collected {len(routes)} routes from {len(service_routes)} services")
+
+    # Phase 2: Scraping routes from a shared queue
+    completed = journal.completed(date) if journal else {}
+    tasks = queue.Queue()
+    results = {}
+    for task_index, (count, route_name, route_link) in enumerate(routes):
+        if (count, route_link) in completed and sink:  # Scraped in a previous run
+            sink.put(completed[(count, route_link)], route=route_name)
+        elif (count, route_link) in completed:
+            results[task_index] = completed[(count, route_link)]
+        else:
+            tasks.put((task_index, (count, route_name, route_link)))
+    if completed:
+        print(f"Resuming, {len(routes) - tasks.qsize()} routes are already scraped")
+
+    if http_scraper:
+        pending = [tasks.get_nowait() for _ in range(tasks.qsize())]
+
+        def store_route_data(position, route_data):
+            task_index, (count, route_name, route_link) = pending[position]
+            if journal:
+                journal.record(count, route_name, route_link, date, route_data)
+            if sink:
+                sink.put(route_data, route=route_name)
+            else:
+                results[task_index] = route_data
+
+        http_scraper.scrape_routes([route for _, route in pending], date, on_route=store_route_data)
+    else:
+        with ThreadPoolExecutor(max_workers=thread_count) as executor:
+            workers = [executor.submit(scrape_route_worker, tasks, results, pool, date, snapshot_dir, journal, sink)
+                       for _ in range(min(thread_count, tasks.qsize()))]
+            for worker in workers:
+                worker.result()  # Raises error of sink, other workers stop at their next put
+
+    scraped_data = []
+    for task_index in sorted(results):
+        scraped_data += results[task_index]
+    return scraped_data
+
+
+def scrape_data_in_parallel(thread_count=2, num_of_elements=10, date=None, snapshot_dir=None, schedule='route',
+                            journal_path=None, resume=False, sink=None, blocked_urls=DEFAULT_BLOCKED_URLS,
+                            backend='selenium', network_stats=False):
+    """
+    Custom method to create separate driver instance and scrape data in parallel
+    :param thread_count: Count of threads to use for execution
+    :param num_of_elements: count of services data to be scraped from RedBus
+    :param date: Date of data to be scraped, If not provided will scrape tomorrow's date by default.
+    :param snapshot_dir: When given, route pages are saved in a new subdirectory of this directory for the run, and
+     parsed in a process pool after the browsers are done.
+    :param schedule: 'route' to spread individual routes over the threads, 'service' to scrape every service in
+     a single thread (default: 'route')
+    :param journal_path: Path of a ScrapeJournal file recording every completed route, needs 'route' schedule and
+     no snapshot_dir, as saved pages are parsed only after the run and a resumed run saves them in a new directory.
+    :param resume: Boolean flag to skip routes already recorded in the journal for the date and use their recorded
+     data, else the journal of the date is cleared before scraping (default: False)
+    :param sink: Object with a put(data, route=None) method, e.g. DataHandler.StreamingWriter, receiving scraped
+     data of every route as soon as it is scraped, with the route name in 'route' schedule. Scraped data is not kept
+     in memory then, and the returned list is empty.
+    :param blocked_urls: url patterns of requests to be blocked in browsers (default: DEFAULT_BLOCKED_URLS)
+    :param backend: 'selenium' to scrape route pages in browsers, 'http' to request search results over HTTP with
+     browsers used only to collect routes, needs 'route' schedule. 'http' is not verified against the live site yet,
+     see HttpScraper (default: 'selenium')
+    :param network_stats: Boolean flag to enable performance log in browsers and print counts of blocked and loaded
+     requests at the end, to measure the effect of blocked_urls (default: False)
+    :return: scraped data
+    """
+    if date is None:
+        date = (datetime.now() + timedelta(days=1)).strftime("%d-%b-%Y")
+    if schedule not in ('route', 'service'):
+        raise ValueError(f"Unknown schedule: {schedule}")
+    if journal_path and schedule != 'route':
+        raise ValueError("Journal can be used only with 'route' schedule")
+    if journal_path and snapshot_dir:
+        raise ValueError("Journal cannot be used with snapshot_dir, routes of an interrupted run would be recorded "
+                         "as completed while their pages are not parsed")
+    if backend not in ('selenium', 'http'):
+        raise ValueError(f"Unknown backend: {backend}")
+    if backend == 'http' and (schedule != 'route' or snapshot_dir):
+        raise ValueError("'http' backend needs 'route' schedule and no snapshot_dir")
+    http_scraper = HttpScraper() if backend == 'http' else None
+    print(f"Start: {datetime.now()}")
+    network_stats = NetworkStats() if network_stats else None
+    # Browser sessions are shared by all tasks
+    pool = DriverPool(URL, thread_count, blocked_urls=blocked_urls, network_stats=network_stats)
+    journal = ScrapeJournal(journal_path) if journal_path else None
+    if journal and not resume:
+        journal.clear(date)
+    if snapshot_dir:  # Only snapshots of this run are parsed
+        snapshot_dir = create_run_dir(snapshot_dir, date)
+        print(f"Saving route pages in '{snapshot_dir}'")
+
+    # Using threads for parallel execution
+    try:
+        if schedule == 'route':
+            parallel_scraped_data = scrape_routes_in_parallel(thread_count, num_of_elements, date, snapshot_dir, pool,
+                                                              journal, sink, http_scraper)
+        else:
+            parallel_scraped_data = scrape_services_in_parallel(thread_count, num_of_elements, date, snapshot_dir,
+                                                                pool, sink)
+    finally:
+        pool.close()
+        if journal:
+            journal.close()
+
+    if snapshot_dir and sink:  # Parsing saved pages outside the browsers
+        sink.put(parse_snapshots_in_parallel(snapshot_dir, date))
+    elif snapshot_dir:
+        parallel_scraped_data += parse_snapshots_in_parallel(snapshot_dir, date)
 
+    if network_stats is not None:
+        print(network_stats)
     print(f"End: {datetime.now()}")
     # print(parallel_scraped_data)
     return parallel_scraped_data
 
 
 URL = "https://www.redbus.in/"
+JOURNAL_PATH = "scrape_journal.db"
 
 if __name__ == "__main__":
-    scraped_data = scrape_data_in_parallel(thread_count=4, num_of_elements=10)
-
     data_handler = DataHandler(
         host='localhost',  # Give your Host name
         user='root',  # Give your username
@@ -401,7 +987,11 @@ if __name__ == "__main__":
         database='Your database name',  # Give your database name
         )
 
-    # Adding scraped data to given Database
-    data_handler.add_scraped_data_to_database('your_table', scraped_data)  # Change your table name
+    scrape_date = (datetime.now() + timedelta(days=1)).strftime("%d-%b-%Y")
+
+    # Adding scraped data to given Database while scraping, in batches
+    with StreamingWriter(data_handler, 'your_table', journey_date=scrape_date) as writer:  # Change your table name
+        scrape_data_in_parallel(thread_count=4, num_of_elements=10, date=scrape_date, journal_path=JOURNAL_PATH,
+                                sink=writer)
 
-    # After changing the database credentials, Execute this class to scrape data from RedBus
\ No newline at end of file
+    # After changing the database credentials, Execute this class to scrape data from RedBus
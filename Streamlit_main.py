@@ -2,15 +2,21 @@ import streamlit as st
 from streamlit_option_menu import option_menu
 import Scraper
 from BusApp import BusApp
-from DataHandler import DataHandler
+from DataHandler import BACKENDS, StreamingWriter, create_data_handler
+from HistoryStore import HISTORY_RETENTION_DAYS, HistoryStore
+from ParquetDataset import ParquetDataset
 
 # Initialize session state variables
-for key in ['user_txt', 'database_txt', 'host_txt', 'table_txt', 'password_txt']:
+for key in ['user_txt', 'database_txt', 'host_txt', 'table_txt', 'password_txt', 'dataset_txt']:
     if key not in st.session_state:
         st.session_state[key] = ''
+if 'backend_txt' not in st.session_state:
+    st.session_state.backend_txt = BACKENDS[0]
+if 'source_txt' not in st.session_state:
+    st.session_state.source_txt = 'database'
 
 
-def fetch_data(user, password, host, database, table):
+def fetch_data(user, password, host, database, table, backend='mysql'):
     """
     custom class to check Database Connection.
     :param user: username of SQL database
@@ -18,25 +24,31 @@ def fetch_data(user, password, host, database, table):
     :param host: host name of SQL database
     :param database:  name of database to be used
     :param table: table name in given database
+    :param backend: storage backend, one of BACKENDS
     :return:
     """
+    db_manager = create_data_handler(backend, host=host, user=user, password=password, database=database)
     try:
-        db_manager = DataHandler(host=host, user=user, password=password, database=database)
-        db_manager.connect()
         st.write("Connecting to database...")
+        if not db_manager.connect():
+            raise ConnectionError("Unable to connect to database")
 
-        data = db_manager.execute_query(f"SELECT * FROM {table};")
-
-        if data:
-            st.session_state.data = data
-            st.write("Data fetched successfully!")
+        row_count = db_manager.probe_table(table)
+        if row_count is None:
+            raise LookupError(f"Table {table} is not present in database")
+        if row_count:
+            # Only a few rows are read for preview, table is read by Select Bus page
+            preview = next(db_manager.iter_query(f"SELECT * FROM {table}", limit=5, as_dataframe=True))
+            st.write(f"Connected successfully! {row_count} rows in table {table}.")
+            st.dataframe(preview, hide_index=True)
         else:
             st.write(f"No data found in table {table}.")
-        db_manager.disconnect()
     except Exception as e:
         st.error(f"Error: {e}")
         st.error("Please check the entered credentials.")
         st.write("Prerequisite: Database and table needs to be present to proceed!")
+    finally:
+        db_manager.disconnect()  # Connection is given back to the shared pool
 
 
 def display_homepage():
@@ -173,26 +185,42 @@ if option == 'Home':
 elif option == 'DataBase':
     st.header("Database Credentials")
     st.info("Prerequisite: Database and Table need to be present in given credentials")
+    st.session_state.backend_txt = st.selectbox("Database Backend", BACKENDS,
+                                                index=BACKENDS.index(st.session_state.backend_txt))
+    if st.session_state.backend_txt == 'sqlite':
+        st.caption("SQLite stores data in a local file: give its path as Database, User, Password and Host are not "
+                   "needed.")
     cols = st.columns(3)
     fields = [('User', 'user_txt'), ('Password', 'password_txt'),
               ('Host', 'host_txt'), ('Database', 'database_txt'),
-              ('Table', 'table_txt')]
+              ('Table', 'table_txt'), ('Parquet Dataset Directory', 'dataset_txt')]
 
     for i, (label, key) in enumerate(fields):
         with cols[i % 3]:
             st.session_state[key] = st.text_input(label, value=st.session_state[key],
                                                   type='password' if label == 'Password' else 'default')
+    sources = ['database', 'parquet', 'query']
+    st.session_state.source_txt = st.radio("Select Bus Data Source", sources, horizontal=True,
+                                           index=sources.index(st.session_state.source_txt))
+    st.caption("Scraped data is also written to Parquet Dataset Directory when given, parquet source reads it "
+               "instead of the table. query source runs filters in database and reads only matching buses.")
 
     if st.button('Check Credentials'):
-        fetch_data(**{k: st.session_state[v] for k, v in zip(['user', 'password', 'host', 'database', 'table'],
+        fetch_data(**{k: st.session_state[v] for k, v in zip(['user', 'password', 'host', 'database', 'table',
+                                                              'backend'],
                                                              ['user_txt', 'password_txt', 'host_txt', 'database_txt',
-                                                              'table_txt'])})
+                                                              'table_txt', 'backend_txt'])})
 elif option == 'Scrape Data':
     st.header("Scrape Data from RedBus")
     col1, col2 = st.columns(2)
     with col1:
         thread_count = st.number_input("Thread Count", min_value=1, max_value=6, step=1, value=1)
         date_selector = st.date_input("Select a date to Scrape data from RedBus")
+        resume_scrape = st.checkbox("Resume previous scrape of this date")
+        refresh_mode = st.selectbox("Table Refresh", ["swap", "replace", "upsert"])
+        keep_history = st.checkbox("Keep price history")
+        retention_days = st.number_input("History retention (days)", min_value=1, step=30,
+                                         value=HISTORY_RETENTION_DAYS, disabled=not keep_history)
     with col2:
         services_count = st.number_input("Number of Services", min_value=1, max_value=15, step=1, value=1)
         st.write('<div style="height: 28px;"></div>', unsafe_allow_html=True)
@@ -206,26 +234,49 @@ elif option == 'Scrape Data':
                 with st.spinner('Scraping data...'):
                     st.info('This process will take around one hour to complete...')
                     date = date_selector.strftime("%d-%b-%Y")
-                    scraped_data = Scraper.scrape_data_in_parallel(thread_count, services_count, date)
-                    data_handler = DataHandler(
-                        **{k: st.session_state[v] for k, v in zip(['host', 'user', 'password', 'database'],
-                                                                  ['host_txt', 'user_txt', 'password_txt',
-                                                                   'database_txt'])})
-                    data_handler.add_scraped_data_to_database(st.session_state.table_txt, scraped_data)
-                    st.success('Scraping Completed!')
+                    data_handler = create_data_handler(
+                        **{k: st.session_state[v] for k, v in zip(['backend', 'host', 'user', 'password', 'database'],
+                                                                  ['backend_txt', 'host_txt', 'user_txt',
+                                                                   'password_txt', 'database_txt'])})
+                    history = None
+                    if keep_history and st.session_state.backend_txt == 'mysql':
+                        history = HistoryStore(data_handler, st.session_state.table_txt, retention_days)
+                    elif keep_history:
+                        st.warning("Price history needs MySQL backend, scraping without history.")
+                    dataset = ParquetDataset(st.session_state.dataset_txt) if st.session_state.dataset_txt else None
+                    # Scraped routes are written to database while scraping continues
+                    with StreamingWriter(data_handler, st.session_state.table_txt, mode=refresh_mode,
+                                         journey_date=date, history=history, dataset=dataset) as writer:
+                        Scraper.scrape_data_in_parallel(thread_count, services_count, date,
+                                                        journal_path=Scraper.JOURNAL_PATH, resume=resume_scrape,
+                                                        sink=writer)
+                    st.success(f'Scraping Completed! {writer.row_count} rows added.')
 
     st.markdown("""
     **NOTE**: 
     - **Thread Count**: count of parallel scraping using Chrome.
     - **Number of Services**: No of Government Services data to be scraped in RedBus.
     - **Date**: Date of Services Data to be scraped from RedBus.
+    - **Resume**: Skips routes already scraped by an interrupted scrape of the same date.
+    - **Table Refresh**: swap loads into a staging table and replaces the table at once when scraping is completed,
+    replace recreates the table at start so rows are visible while scraping, upsert updates only the scraped routes
+    of the date and keeps the rest of the table.
+    - **Keep price history**: Also adds scraped price and seats as a snapshot in <table>_history, to follow changes
+    as departure approaches. Journey dates older than History retention days are dropped after scraping.
     """)
 
 elif option == 'Select Bus':
-    if not st.session_state.database_txt or not st.session_state.host_txt:
+    read_dataset = st.session_state.source_txt == 'parquet'
+    if read_dataset and not st.session_state.dataset_txt:
+        st.error("Please enter Parquet Dataset Directory in Fetch Data page to proceed")
+    elif not read_dataset and (not st.session_state.database_txt or (st.session_state.backend_txt == 'mysql' and
+                                                                     not st.session_state.host_txt)):
         st.error("Please enter database details in Fetch Data page to proceed")
     else:
-        app = BusApp(**{k: st.session_state[v] for k, v in zip(['host', 'user', 'password', 'database', 'table'],
+        app = BusApp(**{k: st.session_state[v] for k, v in zip(['host', 'user', 'password', 'database', 'table',
+                                                                'backend'],
                                                                ['host_txt', 'user_txt', 'password_txt', 'database_txt',
-                                                                'table_txt'])})
+                                                                'table_txt', 'backend_txt'])},
+                     dataset_dir=st.session_state.dataset_txt if read_dataset else None,
+                     push_down=st.session_state.source_txt == 'query')
         app.run()
@@ -0,0 +1,20 @@
+import os
+import sys
+import pytest
+
+# Modules of the application are in repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def bus_row(bus_id, route='Route A', departure_time='21:30', price='1200.00', rating=4.2):
+    """Scraped data row of a bus, as returned by Scraper.scrape_data"""
+    return [route, f"https://www.redbus.in/bus-tickets/{route.lower().replace(' ', '-')}", bus_id, 'A/C Sleeper (2+1)',
+            departure_time, '08h 15m', '05:45', rating, price, 20]
+
+
+@pytest.fixture
+def sqlite_handler(tmp_path):
+    """SQLiteDataHandler of a new database file, not connected"""
+    pytest.importorskip("mysql.connector")
+    from DataHandler import SQLiteDataHandler
+    return SQLiteDataHandler(str(tmp_path / 'buses.db'))
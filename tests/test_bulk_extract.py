@@ -0,0 +1,74 @@
+import os
+import time
+import pytest
+
+pytest.importorskip("selenium")
+from selenium.common import WebDriverException
+from PageParser import parse_page_source
+from Scraper import Scraper
+
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'route_results.html')
+ROUTE_NAME = 'Hyderabad to Vijayawada'
+ROUTE_LINK = 'https://www.redbus.in/bus-tickets/hyderabad-to-vijayawada'
+EXPECTED_ROWS = [
+    [ROUTE_NAME, ROUTE_LINK, 'APSRTC - Amaravati', 'Volvo 9600 A/C Seater/Sleeper (2+1)', '22:30', '05h 15m', '03:45',
+     4.4, '1149.00', 27],
+    [ROUTE_NAME, ROUTE_LINK, 'Orange Tours And Travels', 'NON A/C Seater / Sleeper (2+1)', '23:00', '06h 00m',
+     '05:00', None, '699.00', 4],
+    [ROUTE_NAME, ROUTE_LINK, 'Kaveri Travels', 'A/C Sleeper (2+1)', '06:15', '04h 50m', '11:05', None, '899.50', 1],
+    [ROUTE_NAME, ROUTE_LINK, 'Morning Star Travels', 'Bharat Benz A/C Semi Sleeper (2+2)', '14:40', '05h 35m',
+     '20:15', 3.8, '650.00', 36],
+]
+# Repeats the rows having all fields, so timing is not dominated by waits for missing fields
+REPEAT_ROWS_JS = """
+var list = document.querySelector("ul.bus-items");
+var rows = Array.prototype.filter.call(list.children, function (row) {
+    return row.querySelector("div[class*='rating-sec']") !== null;
+});
+for (var i = 1; i < arguments[0]; i++) {
+    rows.forEach(function (row) { list.appendChild(row.cloneNode(true)); });
+}
+return list.children.length;
+"""
+
+
+@pytest.fixture(scope='module')
+def scraper():
+    try:
+        driver = Scraper.setup_driver_with_headless(f"file://{FIXTURE_PATH}", blocked_urls=[])
+    except WebDriverException as e:
+        pytest.skip(f"Chrome is not available: {e.msg}")
+    driver.implicitly_wait(0)  # Missing fields are waited for by safe_find_element_text only
+    yield Scraper(None, None, driver=driver)
+    driver.quit()
+
+
+def scrape(scraper, bulk_extract):
+    scraper.bulk_extract = bulk_extract
+    started = time.perf_counter()
+    rows = scraper.scrape_data(ROUTE_NAME, ROUTE_LINK)
+    return rows, time.perf_counter() - started
+
+
+def test_snapshot_parser_reads_saved_page():
+    with open(FIXTURE_PATH, encoding='utf-8') as file:
+        assert parse_page_source(file.read(), ROUTE_NAME, ROUTE_LINK) == EXPECTED_ROWS
+
+
+def test_bulk_rows_match_per_element_rows(scraper):
+    scraper.driver.get(f"file://{FIXTURE_PATH}")
+    element_rows, _ = scrape(scraper, bulk_extract=False)
+    bulk_rows, _ = scrape(scraper, bulk_extract=True)
+    assert element_rows == EXPECTED_ROWS
+    assert bulk_rows == element_rows
+
+
+def test_bulk_extract_timing(scraper):
+    scraper.driver.get(f"file://{FIXTURE_PATH}")
+    row_count = scraper.driver.execute_script(REPEAT_ROWS_JS, 25)
+    element_rows, element_seconds = scrape(scraper, bulk_extract=False)
+    bulk_rows, bulk_seconds = scrape(scraper, bulk_extract=True)
+    print(f"\n{row_count} rows, per element: {element_seconds:.3f} s, bulk: {bulk_seconds:.3f} s")
+    assert len(bulk_rows) == row_count
+    assert bulk_rows == element_rows
+    assert bulk_seconds < element_seconds
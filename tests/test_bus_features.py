@@ -0,0 +1,62 @@
+import pandas as pd
+import pytest
+
+from BusFeatures import SEAT_TYPES, classify_ac, classify_seat, seat_classes_for
+
+# bus_type texts seen in RedBus search results, classification of these must match filters of text search
+BUS_TYPE_CORPUS = [
+    "A/C Sleeper (2+1)", "AC Sleeper (2+1)", "A/C Seater / Sleeper (2+1)", "A/C Seater (2+2)",
+    "A/C Semi Sleeper (2+2)", "NON A/C Seater (2+3)", "NON A/C Seater / Sleeper (2+1)", "NON A/C Sleeper (2+1)",
+    "NON A/C Semi Sleeper (2+2)", "NON A/C Airbus (2+2)", "NON-AC Sleeper (2+1)", "Non AC Seater (2+3)",
+    "Non AC Sleeper Seater", "Volvo Multi-Axle A/C Sleeper (2+1)", "Volvo 9600 A/C Seater/Sleeper (2+1)",
+    "Volvo 9600 Multi Axle A/C Sleeper (2+1)", "Volvo A/C Seater (2+2)", "Volvo AC Multi Axle Semi sleeper (2+2)",
+    "Scania Multi-Axle AC Semi Sleeper (2+2)", "Bharat Benz A/C Seater /Sleeper (2+1)", "Electric A/C Seater (2+2)",
+    "AC Seater Push Back (2+2)", "HVAC Seater 2+2", "Pallavan AC Seater", "Rajdhani (AC Semi Sleeper)",
+    "Express(Non AC Seater)", "Super Deluxe Non AC Seater Push Back 2+2", "Ultra Deluxe (Non-AC, 2+2)",
+    "Super Luxury (Non-AC, 2 + 2 Push Back)", "Lahari Non A/C Sleeper Cum Seater", "Indra(A.C. Seater)",
+    "Garuda Plus (Volvo / Benz A.C Semi Sleeper)", "Amaravati (Volvo / Benz A/C Multi Axle)", "Palle Velugu",
+    "SWIFT-DELUXE AIR BUS", "Sleeper Express Non AC", "Volvo Coach", "", None,
+]
+
+# Texts matched by both AC and NON AC text filters, as AC filter only excludes 'NON' and 'Non'
+AC_AND_NON_AC_CORPUS = ["Sleeper (2+1) non AC", "non A/C Seater (2+2)", "NoN AC Semi Sleeper"]
+
+
+# Filters of bus_type text that the app used before seat_class and is_ac were derived at load
+def seat_type_filter(bus_types, seat_type):
+    return bus_types.str.contains(seat_type, case=False, na=False)
+
+
+def ac_filter(bus_types):
+    return bus_types.str.contains(r'^(?=.*\b(?:AC|A/C|HVAC)\b)(?!.*\b(?:NON|Non)\b).*', na=False)
+
+
+def non_ac_filter(bus_types):
+    return (bus_types.str.contains(r'\bnon\b', case=False, na=False) |
+            ~bus_types.str.contains(r'AC|A/C|HVAC', case=False, na=False))
+
+
+@pytest.fixture(scope='module')
+def bus_types():
+    return pd.Series(BUS_TYPE_CORPUS + AC_AND_NON_AC_CORPUS, dtype=object)
+
+
+@pytest.mark.parametrize('seat_type', SEAT_TYPES)
+def test_seat_class_matches_seat_type_filter(bus_types, seat_type):
+    matched = bus_types.map(lambda text: classify_seat(text) in seat_classes_for(seat_type))
+    assert matched.tolist() == seat_type_filter(bus_types, seat_type).tolist()
+
+
+def test_is_ac_matches_ac_type_filters(bus_types):
+    # AC is checked first, so texts matched by both filters are only AC after classification
+    expected = [True if is_ac else False if is_non_ac else None
+                for is_ac, is_non_ac in zip(ac_filter(bus_types), non_ac_filter(bus_types))]
+    assert bus_types.map(classify_ac).tolist() == expected
+
+
+def test_texts_matched_by_both_ac_type_filters_are_ac():
+    bus_types = pd.Series(AC_AND_NON_AC_CORPUS, dtype=object)
+    assert ac_filter(bus_types).all() and non_ac_filter(bus_types).all()
+    corpus = pd.Series(BUS_TYPE_CORPUS, dtype=object)
+    assert not (ac_filter(corpus) & non_ac_filter(corpus)).any()
+    assert all(classify_ac(text) is True for text in AC_AND_NON_AC_CORPUS)
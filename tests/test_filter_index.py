@@ -0,0 +1,86 @@
+import itertools
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+from BusFeatures import SEAT_CLASSES, SEAT_TYPES, seat_classes_for
+from FilterIndex import FilterIndex
+from FilterQuery import time_range_minutes
+
+ROUTES = ['Route 0', 'Route 1', 'Route 2', 'Unknown Route']
+TIME_RANGES = ['00:00-06:00', '06:00-12:00', '12:00-18:00', '18:00-00:00', '05:30-13:15', '22:45-03:10']
+
+
+@pytest.fixture(scope='module')
+def index():
+    row_count = 5000
+    generator = np.random.default_rng(11)
+
+    def with_missing(values, dtype=None):
+        series = pd.Series(values, dtype=dtype)
+        return series.mask(generator.random(row_count) < 0.05)
+
+    data = pd.DataFrame({
+        'route': with_missing(generator.choice(ROUTES[:3], row_count)),
+        'seat_class': pd.Categorical(generator.choice(SEAT_CLASSES, row_count), categories=SEAT_CLASSES),
+        'is_ac': with_missing(generator.choice([True, False], row_count), dtype="boolean"),
+        'departure_minute': with_missing(generator.integers(0, 24 * 60, row_count), dtype="Int64"),
+        'rating': with_missing(np.round(generator.uniform(1, 5, row_count), 1)),
+        'price': with_missing(np.round(generator.uniform(200, 3000, row_count), 2)),
+        'duration_minutes': with_missing(generator.integers(60, 20 * 60, row_count), dtype="Int64"),
+    })
+    return FilterIndex(data)
+
+
+def filter_with_masks(df, filters):
+    """Select Bus filters applied with pandas masks, rows without a filtered value are dropped"""
+    if filters['route'] != 'All':
+        df = df[df["route"] == filters['route']]
+    if filters['seat_type'] != 'All':
+        df = df[df["seat_class"].isin(seat_classes_for(filters['seat_type']))]
+    if filters['ac_type'] != 'All':
+        df = df[df["is_ac"].eq(filters['ac_type'] == 'AC').fillna(False)]
+    if filters['time_range'] != 'All':
+        start_minute, end_minute = time_range_minutes(filters['time_range'])
+        minutes = df["departure_minute"]
+        if start_minute < end_minute:
+            df = df[((minutes >= start_minute) & (minutes < end_minute)).fillna(False)]
+        else:
+            df = df[((minutes >= start_minute) | (minutes < end_minute)).fillna(False)]
+    if filters['min_rating'] is not None:
+        df = df[df["rating"] >= filters['min_rating']]
+    if filters['max_fare'] is not None:
+        df = df[df["price"] <= filters['max_fare']]
+    if filters['max_duration'] is not None:
+        df = df[(df["duration_minutes"] <= filters['max_duration'] * 60).fillna(False)]
+    return df
+
+
+FILTER_COMBINATIONS = [
+    dict(zip(['route', 'seat_type', 'ac_type', 'time_range'], values))
+    for values in itertools.product(['All'] + ROUTES, ['All'] + SEAT_TYPES, ['All', 'AC', 'NON AC'],
+                                    ['All'] + TIME_RANGES)
+]
+RANGE_COMBINATIONS = [
+    {'min_rating': None, 'max_fare': None, 'max_duration': None},
+    {'min_rating': 3.5, 'max_fare': 1500, 'max_duration': 12},
+    {'min_rating': 4.9, 'max_fare': 200, 'max_duration': 1},
+]
+
+
+@pytest.mark.parametrize('ranges', RANGE_COMBINATIONS)
+def test_query_rows_match_pandas_masks(index, ranges):
+    for filters in FILTER_COMBINATIONS:
+        filters = {**filters, **ranges}
+        expected = filter_with_masks(index.df, filters)
+        assert index.query_rows(filters).tolist() == expected.index.tolist(), filters
+
+
+def test_sort_rows_put_missing_values_last(index):
+    rows = index.query_rows({'route': 'Route 1'})
+    for column in ['rating', 'price', 'duration_minutes', 'departure_minute']:
+        for descending in (False, True):
+            values = index.df[column].take(index.sort_rows(rows, column, descending)).astype(float)
+            valued = values.dropna()
+            assert values.isna().sum() and values.iloc[len(valued):].isna().all()
+            assert valued.is_monotonic_decreasing if descending else valued.is_monotonic_increasing
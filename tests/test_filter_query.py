@@ -0,0 +1,31 @@
+import pytest
+
+pytest.importorskip("mysql.connector")
+from conftest import bus_row
+from FilterQuery import build_filter_query
+
+RATINGS = [4.2, None, 4.2, 3.0, None, 4.2, 3.0]
+
+
+@pytest.fixture
+def data_handler(sqlite_handler):
+    sqlite_handler.add_scraped_data_to_database('buses', [bus_row(f"Bus {number}", rating=rating)
+                                                          for number, rating in enumerate(RATINGS)], mode='swap')
+    sqlite_handler.connect()
+    yield sqlite_handler
+    sqlite_handler.disconnect()
+
+
+def fetch_pages(data_handler, descending, limit=2):
+    bus_ids = []
+    for offset in range(0, len(RATINGS), limit):
+        query, params = build_filter_query('buses', {}, data_handler.PLACEHOLDER, order_by=('rating',), limit=limit,
+                                           offset=offset, descending=descending)
+        bus_ids += [row['bus_id'] for row in data_handler.execute_query(query, params)]
+    return bus_ids
+
+
+@pytest.mark.parametrize('descending, expected', [(False, [3, 6, 0, 2, 5, 1, 4]), (True, [0, 2, 5, 3, 6, 1, 4])])
+def test_pages_are_ordered_with_missing_values_last(data_handler, descending, expected):
+    # Buses of equal rating keep their insertion order in every page
+    assert fetch_pages(data_handler, descending) == [f"Bus {number}" for number in expected]
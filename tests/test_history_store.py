@@ -0,0 +1,100 @@
+import re
+from datetime import date
+import pytest
+
+pytest.importorskip("mysql.connector")
+from conftest import bus_row
+from DataHandler import StreamingWriter
+from HistoryStore import FUTURE_PARTITION, HistoryStore, partition_name
+
+JOURNEY_DATE = '17-Oct-2024'
+
+
+class StandInCursor:
+    """Cursor answering the statements of HistoryStore, keeping partitions and route dictionary in memory"""
+    def __init__(self):
+        self.statements = []
+        self.partitions = [FUTURE_PARTITION]
+        self.routes = {}
+        self.result = []
+
+    def execute(self, query, params=None):
+        query = ' '.join(query.split())
+        self.statements.append(query)
+        self.result = []
+        if 'information_schema.PARTITIONS' in query:
+            self.result = [(name,) for name in self.partitions]
+        elif 'information_schema.STATISTICS' in query:
+            self.result = [(1,)]
+        elif 'REORGANIZE PARTITION' in query:
+            self.partitions.append(re.search(r'INTO \( PARTITION (\w+)', query).group(1))
+        elif 'DROP PARTITION' in query:
+            dropped = query.split('DROP PARTITION ')[1].split(', ')
+            self.partitions = [name for name in self.partitions if name not in dropped]
+        elif query.startswith('SELECT route, url, route_id'):
+            self.result = [(route, url, route_id) for (route, url), route_id in self.routes.items()]
+
+    def executemany(self, query, rows):
+        self.statements.append(' '.join(query.split()))
+        if 'INSERT IGNORE' in query:
+            for route in rows:
+                assert None not in route  # Columns of route dictionary are NOT NULL
+                self.routes.setdefault(route, len(self.routes) + 1)
+
+    def fetchall(self):
+        return self.result
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def count(self, text):
+        return sum(text in statement for statement in self.statements)
+
+
+class StandInConnection:
+    def commit(self):
+        pass
+
+
+class StandInHandler:
+    """DataHandler of a MySQL database, with StandInCursor"""
+    def __init__(self):
+        self.cursor = StandInCursor()
+        self.connection = StandInConnection()
+
+
+@pytest.fixture
+def history():
+    return HistoryStore(StandInHandler(), 'buses', retention_days=30)
+
+
+def test_partitions_are_read_once_per_journey_date(history):
+    for _ in range(3):
+        history.record([bus_row('Bus 1'), bus_row('Bus 2')], JOURNEY_DATE)
+    history.record([bus_row('Bus 1')], '18-Oct-2024')
+    cursor = history.data_handler.cursor
+    assert cursor.count('information_schema.PARTITIONS') == 2
+    assert cursor.count('REORGANIZE PARTITION') == 2
+
+
+def test_rows_without_url_are_recorded(history):
+    row = bus_row('Bus 1')
+    row[1] = None
+    assert history.record([row, bus_row('Bus 2')], JOURNEY_DATE) == 2
+    assert set(history.data_handler.cursor.routes) == {('Route A', ''), ('Route A', bus_row('Bus 2')[1])}
+
+
+def test_retention_drops_old_partitions(history):
+    for journey_date in ['01-Sep-2024', '16-Sep-2024', '17-Sep-2024', '17-Oct-2024']:
+        history.record([bus_row('Bus 1')], journey_date)
+    assert history.apply_retention(today=date(2024, 10, 17)) == ['p20240901', 'p20240916']
+    assert history.data_handler.cursor.partitions == [FUTURE_PARTITION, 'p20240917', 'p20241017']
+    history.record([bus_row('Bus 1')], '01-Sep-2024')  # Dropped partition is added again
+    assert 'p20240901' in history.data_handler.cursor.partitions
+
+
+def test_writer_applies_retention_when_closed(history, sqlite_handler):
+    history.record([bus_row('Bus 1')], '01-Jan-2020')
+    with StreamingWriter(sqlite_handler, 'buses', journey_date=JOURNEY_DATE, history=history) as writer:
+        writer.put([bus_row('Bus 1')])
+    assert partition_name(date(2020, 1, 1)) not in history.data_handler.cursor.partitions
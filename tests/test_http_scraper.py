@@ -0,0 +1,126 @@
+import asyncio
+import json
+import os
+import threading
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("lxml")
+from aiohttp import web
+import HttpScraper as http_scraper_module
+from HttpScraper import HttpScraper
+from PageParser import parse_page_source
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+DATE = '17-Oct-2024'
+ROUTE_NAME = 'Hyderabad to Vijayawada'
+ROUTE_PATH = '/bus-tickets/hyderabad-to-vijayawada'
+# Route page having city ids only in its search link, as route links collected in service pages have none
+ROUTE_PAGE = """
+<html><body>
+<a class="search" href="/bus-tickets/hyderabad-to-vijayawada?fromCityId=124&amp;toCityId=134">Search</a>
+</body></html>
+"""
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as file:
+        return file.read()
+
+
+class StandInServer:
+    """
+    Local stand-in of route pages and search results endpoint. Search results in fixtures are hand-written in the
+    format parse_search_response reads, not recorded from the live site, so they check paging and row conversion only.
+    """
+    def __init__(self, ignore_offset=False):
+        self.buses = json.loads(load_fixture('search_results.json'))['inv']
+        self.ignore_offset = ignore_offset
+        self.search_requests = []
+        self.app = web.Application()
+        self.app.router.add_get(ROUTE_PATH, self.route_page)
+        self.app.router.add_get('/bus-tickets/unknown-route', self.unknown_route_page)
+        self.app.router.add_post('/search/SearchResults', self.search_results)
+
+    async def route_page(self, request):
+        return web.Response(text=ROUTE_PAGE, content_type='text/html')
+
+    async def unknown_route_page(self, request):
+        return web.Response(text="<html><body>No route</body></html>", content_type='text/html')
+
+    async def search_results(self, request):
+        self.search_requests.append(dict(request.query))
+        if (request.query['fromCity'], request.query['toCity']) != ('124', '134') or request.query['DOJ'] != DATE:
+            return web.json_response({'inv': []})
+        offset = 0 if self.ignore_offset else int(request.query['offset'])
+        return web.json_response({'inv': self.buses[offset:offset + int(request.query['limit'])]})
+
+    def scrape(self, route_paths, on_route=None):
+        async def run():
+            runner = web.AppRunner(self.app)
+            await runner.setup()
+            site = web.TCPSite(runner, '127.0.0.1', 0)
+            await site.start()
+            base_url = f"http://127.0.0.1:{runner.addresses[0][1]}"
+            try:
+                scraper = HttpScraper(search_url=f"{base_url}/search/SearchResults", timeout=5)
+                routes = [(1, ROUTE_NAME, base_url + path) for path in route_paths]
+                return await scraper.scrape_routes_async(routes, DATE, on_route), base_url
+            finally:
+                await runner.cleanup()
+        return asyncio.run(run())
+
+
+def test_replayed_results_match_page_rows():
+    server = StandInServer()
+    (route_data,), base_url = server.scrape([ROUTE_PATH])
+    route_link = base_url + ROUTE_PATH
+    page_rows = parse_page_source(load_fixture('route_results.html'), ROUTE_NAME, route_link)
+    assert route_data[:len(page_rows)] == page_rows
+    assert route_data[-1] == [ROUTE_NAME, route_link, 'SRS Travels', 'NON A/C Seater (2+3)', '09:00', '05h 30m',
+                              '14:30', 3.1, '450.00', None]
+
+
+def test_results_are_paged(monkeypatch):
+    monkeypatch.setattr(http_scraper_module, 'PAGE_SIZE', 2)
+    server = StandInServer()
+    (route_data,), _ = server.scrape([ROUTE_PATH])
+    assert len(route_data) == len(server.buses)
+    assert [request['offset'] for request in server.search_requests] == ['0', '2', '4']
+
+
+def test_paging_stops_when_offset_is_ignored(monkeypatch):
+    monkeypatch.setattr(http_scraper_module, 'PAGE_SIZE', 2)
+    server = StandInServer(ignore_offset=True)
+    (route_data,), _ = server.scrape([ROUTE_PATH])
+    assert len(route_data) == 2
+    assert len(server.search_requests) == 2
+
+
+def test_route_without_city_ids_fails_alone():
+    server = StandInServer()
+    (unknown_data, route_data), _ = server.scrape(['/bus-tickets/unknown-route', ROUTE_PATH])
+    assert unknown_data is None
+    assert len(route_data) == len(server.buses)
+
+
+def test_routes_are_stored_off_event_loop():
+    stored = []
+
+    def on_route(position, route_data):
+        stored.append((position, len(route_data), threading.current_thread() is threading.main_thread()))
+
+    StandInServer().scrape([ROUTE_PATH, ROUTE_PATH], on_route)
+    assert sorted(stored) == [(0, 5, False), (1, 5, False)]
+
+
+def test_storing_error_stops_scraping():
+    stored = []
+
+    def on_route(position, route_data):
+        stored.append(position)
+        raise RuntimeError("Writer stopped")
+
+    with pytest.raises(RuntimeError, match="Writer stopped"):
+        StandInServer().scrape([ROUTE_PATH] * 5, on_route)
+    assert len(stored) == 1
@@ -0,0 +1,54 @@
+import os
+import pytest
+
+pytest.importorskip("mysql.connector")
+pytest.importorskip("pyarrow")
+from conftest import bus_row
+from DataHandler import StreamingWriter
+from ParquetDataset import ParquetDataset
+
+JOURNEY_DATE = '17-Oct-2024'
+
+
+def dataset_files(dataset):
+    return sorted(os.path.relpath(os.path.join(root, name), dataset.path)
+                  for root, _, files in os.walk(dataset.path) for name in files)
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    return ParquetDataset(str(tmp_path / 'dataset'))
+
+
+def test_writer_writes_a_file_per_route_when_closed(sqlite_handler, dataset):
+    with StreamingWriter(sqlite_handler, 'buses', batch_size=1, mode='swap', journey_date=JOURNEY_DATE,
+                         dataset=dataset) as writer:
+        for bus_id in range(3):
+            writer.put([bus_row(f"Bus {bus_id}"), bus_row(f"Bus {bus_id}", route='Route B')])
+        assert dataset_files(dataset) == []  # Nothing is written before the table is swapped
+    files = dataset_files(dataset)
+    assert [os.path.dirname(file) for file in files] == [os.path.join('journey_date=2024-10-17', 'route=Route%20A'),
+                                                         os.path.join('journey_date=2024-10-17', 'route=Route%20B')]
+    df = dataset.read()
+    assert sorted(zip(df['route'], df['bus_id'])) == sorted((route, f"Bus {bus_id}") for route in ['Route A', 'Route B']
+                                                            for bus_id in range(3))
+
+
+def test_writer_does_not_write_dataset_when_scraping_fails(sqlite_handler, dataset):
+    with pytest.raises(ValueError):
+        with StreamingWriter(sqlite_handler, 'buses', mode='swap', journey_date=JOURNEY_DATE,
+                             dataset=dataset) as writer:
+            writer.put([bus_row('Bus 1')])
+            raise ValueError("Scraping failed")
+    assert dataset_files(dataset) == []
+
+
+def test_load_does_not_write_dataset_when_swap_fails(sqlite_handler, dataset, monkeypatch):
+    def fail_swap(table_name):
+        raise sqlite_handler.DatabaseError("Renaming table failed")
+
+    monkeypatch.setattr(sqlite_handler, 'swap_staging_table', fail_swap)
+    with pytest.raises(sqlite_handler.DatabaseError):
+        sqlite_handler.add_scraped_data_to_database('buses', [bus_row('Bus 1')], journey_date=JOURNEY_DATE,
+                                                    dataset=dataset)
+    assert dataset_files(dataset) == []
@@ -0,0 +1,83 @@
+import json
+import os
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+import pytest
+
+pytest.importorskip("selenium")
+from selenium.common import WebDriverException
+from selenium.webdriver.support.wait import WebDriverWait
+from Scraper import DEFAULT_BLOCKED_URLS, NetworkStats, Scraper
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+PAGE_PATH = '/blocking_page.html'
+XHR_PATH = '/api/search-results'
+# Resources referenced by the page that are not needed to scrape it
+BLOCKED_PATHS = ['/images/logo.png', '/fonts/brand.woff2', '/styles/search.css',
+                 '/www.google-analytics.com/analytics.js']
+# Stylesheets are not in the default list, they are blocked through the configurable list
+BLOCKED_URLS = DEFAULT_BLOCKED_URLS + ['*.css*']
+
+
+@pytest.fixture
+def server():
+    """Local HTTP server of fixture files and a search results endpoint, recording every requested path"""
+    requested = []
+
+    class Handler(SimpleHTTPRequestHandler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=FIXTURES_DIR, **kwargs)
+
+        def do_GET(self):
+            requested.append(urlsplit(self.path).path)
+            if self.path != XHR_PATH:
+                return super().do_GET()
+            body = json.dumps({'buses': ['APSRTC - Amaravati', 'Orange Tours And Travels']}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    http_server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=http_server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{http_server.server_address[1]}", requested
+    http_server.shutdown()
+    http_server.server_close()
+
+
+def load_page(base_url, blocked_urls, network_stats=None):
+    try:
+        driver = Scraper.setup_driver_with_headless(base_url + PAGE_PATH, blocked_urls=blocked_urls,
+                                                    network_log=network_stats is not None)
+    except WebDriverException as e:
+        pytest.skip(f"Chrome is not available: {e.msg}")
+    try:
+        WebDriverWait(driver, 10).until(
+            lambda d: d.execute_script("return document.body.getAttribute('data-loaded') === 'true';"))
+        row_count = driver.execute_script("return document.querySelectorAll('ul.bus-items li').length;")
+        if network_stats is not None:
+            network_stats.update(driver.get_log('performance'))
+        return row_count
+    finally:
+        driver.quit()
+
+
+def test_page_fetches_resources_without_block_list(server):
+    base_url, requested = server
+    assert load_page(base_url, blocked_urls=[]) == 2
+    assert set(BLOCKED_PATHS) <= set(requested)
+
+
+def test_blocked_resources_are_never_fetched(server):
+    base_url, requested = server
+    network_stats = NetworkStats()
+    assert load_page(base_url, BLOCKED_URLS, network_stats) == 2
+    assert PAGE_PATH in requested and XHR_PATH in requested
+    assert not set(BLOCKED_PATHS) & set(requested)
+    assert network_stats.blocked_requests >= len(BLOCKED_PATHS)
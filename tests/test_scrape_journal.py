@@ -0,0 +1,31 @@
+import pytest
+
+pytest.importorskip("selenium")
+from Scraper import scrape_data_in_parallel
+from ScrapeJournal import ScrapeJournal
+
+DATE = '17-Oct-2024'
+
+
+def test_journal_keeps_data_of_completed_routes(tmp_path):
+    journal = ScrapeJournal(str(tmp_path / 'journal.db'))
+    journal.record(1, 'Route A', '/bus-tickets/route-a', DATE, [['Route A', '/bus-tickets/route-a', 'Bus 1']])
+    journal.record(1, 'Route B', '/bus-tickets/route-b', DATE, [])
+    journal.close()
+    journal = ScrapeJournal(str(tmp_path / 'journal.db'))
+    assert journal.completed(DATE) == {(1, '/bus-tickets/route-a'): [['Route A', '/bus-tickets/route-a', 'Bus 1']],
+                                       (1, '/bus-tickets/route-b'): []}
+    journal.clear(DATE)
+    assert journal.completed(DATE) == {}
+    journal.close()
+
+
+def test_resume_is_rejected_in_snapshot_mode(tmp_path):
+    snapshot_dir = tmp_path / 'snapshots'
+    snapshot_dir.mkdir()
+    # Snapshots of the interrupted run are in its own run directory, which a resumed run would not parse
+    with pytest.raises(ValueError, match="snapshot_dir"):
+        scrape_data_in_parallel(date=DATE, snapshot_dir=str(snapshot_dir), journal_path=str(tmp_path / 'journal.db'),
+                                resume=True)
+    assert list(snapshot_dir.iterdir()) == []
+    assert not (tmp_path / 'journal.db').exists()
@@ -0,0 +1,65 @@
+import queue
+from contextlib import contextmanager
+import pytest
+
+pytest.importorskip("selenium")
+from Scraper import Scraper, scrape_route_worker
+
+DATE = '17-Oct-2024'
+
+
+class StandInPool:
+    """DriverPool handing out a placeholder driver, routes are scraped by the patched Scraper.scrape_route"""
+    @contextmanager
+    def lease(self, url=None):
+        yield object()
+
+
+class RecordingSink:
+    """Sink keeping route names and data it is given"""
+    def __init__(self):
+        self.routes = {}
+
+    def put(self, data, route=None):
+        self.routes[route] = data
+
+
+class StoppedSink:
+    """Sink of a StreamingWriter whose thread stopped on an error"""
+    def __init__(self):
+        self.calls = 0
+
+    def put(self, data, route=None):
+        self.calls += 1
+        raise RuntimeError("Writer of 'buses' stopped on error")
+
+
+@pytest.fixture
+def route_tasks(monkeypatch):
+    monkeypatch.setattr(Scraper, 'scrape_route', lambda self, route_name, route_link: [[route_name, route_link]])
+    tasks = queue.Queue()
+    for task_index in range(5):
+        tasks.put((task_index, (1, f"Route {task_index}", f"/bus-tickets/route-{task_index}")))
+    return tasks
+
+
+def test_worker_stores_routes_in_results(route_tasks):
+    results = {}
+    scrape_route_worker(route_tasks, results, StandInPool(), DATE)
+    assert results == {task_index: [[f"Route {task_index}", f"/bus-tickets/route-{task_index}"]]
+                       for task_index in range(5)}
+
+
+def test_worker_stops_when_sink_fails(route_tasks):
+    sink = StoppedSink()
+    with pytest.raises(RuntimeError, match="stopped on error"):
+        scrape_route_worker(route_tasks, {}, StandInPool(), DATE, sink=sink)
+    assert sink.calls == 1
+    assert route_tasks.qsize() == 4
+
+
+def test_worker_puts_routes_without_buses(route_tasks, monkeypatch):
+    monkeypatch.setattr(Scraper, 'scrape_route', lambda self, route_name, route_link: None)  # No buses found
+    sink = RecordingSink()
+    scrape_route_worker(route_tasks, {}, StandInPool(), DATE, sink=sink)
+    assert sink.routes == {f"Route {task_index}": [] for task_index in range(5)}
@@ -0,0 +1,95 @@
+import time
+import pytest
+
+pytest.importorskip("mysql.connector")
+from conftest import bus_row
+from DataHandler import StreamingWriter
+
+JOURNEY_DATE = '17-Oct-2024'
+
+
+def table_rows(data_handler, table_name):
+    data_handler.connect()
+    try:
+        if not data_handler.table_exists(table_name):
+            return None
+        return data_handler.execute_query(f"SELECT route, bus_id, price FROM {table_name} ORDER BY route, bus_id")
+    finally:
+        data_handler.disconnect()
+
+
+def test_swap_replaces_table_when_completed(sqlite_handler):
+    with StreamingWriter(sqlite_handler, 'buses', batch_size=2, mode='swap') as writer:
+        writer.put([bus_row('Bus 1'), bus_row('Bus 2')])
+        writer.put([bus_row('Bus 3', route='Route B')])
+    assert [row['bus_id'] for row in table_rows(sqlite_handler, 'buses')] == ['Bus 1', 'Bus 2', 'Bus 3']
+
+
+def test_writer_error_fails_put_and_close(sqlite_handler):
+    writer = StreamingWriter(sqlite_handler, 'buses', batch_size=1, max_pending=1, mode='swap')
+    writer.start()
+    writer.put([['Route A']])  # Row without columns fails in writer thread
+    started = time.monotonic()
+    with pytest.raises(RuntimeError):
+        for _ in range(10):
+            writer.put([bus_row('Bus 1')])
+    assert time.monotonic() - started < 5
+    with pytest.raises(RuntimeError):
+        writer.close()
+    assert isinstance(writer.error, IndexError)
+    assert table_rows(sqlite_handler, 'buses') is None
+
+
+def test_scraping_error_keeps_table(sqlite_handler):
+    with StreamingWriter(sqlite_handler, 'buses', mode='swap') as writer:
+        writer.put([bus_row('Bus 1')])
+    with pytest.raises(ValueError):
+        with StreamingWriter(sqlite_handler, 'buses', mode='swap') as writer:
+            writer.put([bus_row('Bus 2')])
+            raise ValueError("Scraping failed")
+    assert [row['bus_id'] for row in table_rows(sqlite_handler, 'buses')] == ['Bus 1']
+    assert [row['bus_id'] for row in table_rows(sqlite_handler, 'buses_staging')] == ['Bus 2']
+
+
+def test_scraping_error_keeps_stale_rows(sqlite_handler):
+    with StreamingWriter(sqlite_handler, 'buses', mode='upsert', journey_date=JOURNEY_DATE) as writer:
+        writer.put([bus_row('Bus 1'), bus_row('Bus 2')])
+    with pytest.raises(ValueError):
+        with StreamingWriter(sqlite_handler, 'buses', mode='upsert', journey_date=JOURNEY_DATE) as writer:
+            writer.put([bus_row('Bus 1', price='999.00')])
+            raise ValueError("Scraping failed")
+    assert [(row['bus_id'], row['price']) for row in table_rows(sqlite_handler, 'buses')] == [('Bus 1', 999),
+                                                                                               ('Bus 2', 1200)]
+
+
+@pytest.mark.parametrize('route_data', [[], [bus_row('Bus 3', departure_time='--')]])
+def test_stale_rows_of_route_without_buses_are_deleted(sqlite_handler, route_data):
+    with StreamingWriter(sqlite_handler, 'buses', mode='upsert', journey_date=JOURNEY_DATE) as writer:
+        writer.put([bus_row('Bus 1'), bus_row('Bus 2')], route='Route A')
+        writer.put([bus_row('Bus 1', route='Route B')], route='Route B')
+    with StreamingWriter(sqlite_handler, 'buses', mode='upsert', journey_date=JOURNEY_DATE) as writer:
+        writer.put(route_data, route='Route A')  # Route has no buses, or only buses without departure time
+    assert [(row['route'], row['bus_id']) for row in table_rows(sqlite_handler, 'buses')] == [('Route B', 'Bus 1')]
+
+
+def test_generation_is_bumped_once_per_flush_interval(sqlite_handler):
+    with StreamingWriter(sqlite_handler, 'buses', batch_size=1, flush_interval=60) as writer:
+        for bus_id in range(5):
+            writer.put([bus_row(f"Bus {bus_id}")])
+    sqlite_handler.connect()
+    try:
+        # Table creation, first batch, and remaining batches when writer is closed
+        assert sqlite_handler.table_generation('buses') == 3
+    finally:
+        sqlite_handler.disconnect()
+
+
+def test_connection_is_released_when_start_fails(sqlite_handler, monkeypatch):
+    def fail_server_time():
+        raise sqlite_handler.DatabaseError("Server went away")
+
+    monkeypatch.setattr(sqlite_handler, 'server_time', fail_server_time)
+    with pytest.raises(sqlite_handler.DatabaseError):
+        with StreamingWriter(sqlite_handler, 'buses', mode='upsert', journey_date=JOURNEY_DATE):
+            pass
+    assert sqlite_handler.connection is None
@@ -0,0 +1,58 @@
+import pytest
+
+pytest.importorskip("mysql.connector")
+from conftest import bus_row
+
+JOURNEY_DATE = '17-Oct-2024'
+
+
+def table_rows(data_handler, table_name='buses'):
+    data_handler.connect()
+    try:
+        return data_handler.execute_query(f"SELECT bus_id, departure_time, price FROM {table_name} ORDER BY bus_id")
+    finally:
+        data_handler.disconnect()
+
+
+def test_rows_without_departure_time_are_not_duplicated(sqlite_handler):
+    data = [bus_row('Bus 1'), bus_row('Bus 2', departure_time='--')]
+    for _ in range(2):
+        sqlite_handler.add_scraped_data_to_database('buses', data, mode='upsert', journey_date=JOURNEY_DATE)
+    assert table_rows(sqlite_handler) == [{'bus_id': 'Bus 1', 'departure_time': '21:30:00', 'price': 1200}]
+
+
+def test_stale_rows_are_deleted(sqlite_handler):
+    sqlite_handler.add_scraped_data_to_database('buses', [bus_row('Bus 1'), bus_row('Bus 2')], mode='upsert',
+                                                journey_date=JOURNEY_DATE)
+    sqlite_handler.add_scraped_data_to_database('buses', [bus_row('Bus 2', price='999.00')], mode='upsert',
+                                                journey_date=JOURNEY_DATE)
+    assert table_rows(sqlite_handler) == [{'bus_id': 'Bus 2', 'departure_time': '21:30:00', 'price': 999}]
+
+
+def test_legacy_table_without_journey_date_is_rejected(sqlite_handler):
+    sqlite_handler.connect()
+    sqlite_handler.cursor.execute("CREATE TABLE buses (route TEXT, bus_id TEXT, bus_type TEXT, departure_time TEXT)")
+    sqlite_handler.connection.commit()
+    sqlite_handler.disconnect()
+    with pytest.raises(ValueError, match="journey_date"):
+        sqlite_handler.add_scraped_data_to_database('buses', [bus_row('Bus 1')], mode='upsert',
+                                                    journey_date=JOURNEY_DATE)
+
+
+def test_table_with_duplicate_journeys_is_rejected(sqlite_handler):
+    sqlite_handler.add_scraped_data_to_database('buses', [bus_row('Bus 1'), bus_row('Bus 1')], mode='swap',
+                                                journey_date=JOURNEY_DATE)
+    with pytest.raises(ValueError, match="1 journeys with more than one row"):
+        sqlite_handler.add_scraped_data_to_database('buses', [bus_row('Bus 1')], mode='upsert',
+                                                    journey_date=JOURNEY_DATE)
+
+
+def test_connection_is_released_when_load_fails(sqlite_handler, monkeypatch):
+    def fail_swap(table_name):
+        raise sqlite_handler.DatabaseError("Renaming table failed")
+
+    monkeypatch.setattr(sqlite_handler, 'swap_staging_table', fail_swap)
+    with pytest.raises(sqlite_handler.DatabaseError):
+        sqlite_handler.add_scraped_data_to_database('buses', [bus_row('Bus 1')], mode='swap',
+                                                    journey_date=JOURNEY_DATE)
+    assert sqlite_handler.connection is None